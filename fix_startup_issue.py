@@ -21,6 +21,8 @@ try:
 except ImportError:
     HAS_PSUTIL = False
 
+_VERSION_RE = re.compile(r"(\d+\.\d+\.\d+\.\d+)")
+
 
 def get_local_chrome_version(chrome_path: Optional[str] = None) -> Optional[str]:
     system = platform.system().lower()
@@ -48,7 +50,7 @@ def get_local_chrome_version(chrome_path: Optional[str] = None) -> Optional[str]
         try:
             out = subprocess.check_output([bin_path, '--version'], stderr=subprocess.STDOUT, timeout=5)
             text = out.decode(errors='ignore').strip()
-            match = re.search(r"(\d+\.\d+\.\d+\.\d+)", text)
+            match = _VERSION_RE.search(text)
             if match:
                 return match.group(1)
         except Exception:
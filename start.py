@@ -15,12 +15,67 @@ import json
 import argparse
 import subprocess
 import re
+import math
 import atexit
 import signal
+import socket
+import tempfile
+import functools
+import contextlib
+import collections
 
+from types import SimpleNamespace
 from typing import Optional
+from importlib import import_module
+from importlib.util import find_spec
 from urllib.parse import urlparse
 
+# 可选：装了 orjson 就用它读写本脚本的 JSON 文件（直接产出 bytes），否则回退标准库 json
+try:
+    import orjson
+
+    def _json_dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+
+    _json_loads = orjson.loads
+except ImportError:
+    def _json_dumps(obj):
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+
+    def _json_loads(data):
+        return json.loads(data.decode('utf-8'))
+
+
+def _write_json_atomic(path, obj):
+    """Write obj as JSON to path via a temp file + os.replace (never leaves a half-written file)."""
+    # 临时文件名唯一：--workers 的多个进程可能同时写同一个文件
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_json_dumps(obj))
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+
+
+# selenium 相关的模块级名称：导入本文件时不加载 selenium（首次运行时可能尚未安装，
+# --help 等也用不到），由 _load_selenium() 在依赖就绪后、浏览器启动前补齐
+By = WebDriverWait = EC = None
+
+
+def _load_selenium():
+    global By, WebDriverWait, EC
+    if By is None:
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+
+
+# platform.system() may shell out (uname) or hit the registry; resolve it once
+_SYSTEM = platform.system().lower()
+
 DEFAULT_RATE_CONFIG = {
     'scroll_delay_min': 2.6,
     'scroll_delay_max': 4.4,
@@ -33,56 +88,196 @@ DEFAULT_RATE_CONFIG = {
 }
 
 
-def normalize_rate_config(raw):
-    """Convert arbitrary dict-like input into a sanitized rate configuration."""
-    config = dict(DEFAULT_RATE_CONFIG)
-    if isinstance(raw, dict):
-        for key in DEFAULT_RATE_CONFIG:
-            if key in raw:
-                try:
-                    config[key] = max(0.0, float(raw[key]))
-                except Exception:
-                    pass
-    for prefix in ('scroll', 'like', 'topic'):
-        min_key = f'{prefix}_delay_min'
-        max_key = f'{prefix}_delay_max'
+# 各类停顿对应的配置键，预先拼好，避免每次调用都格式化字符串
+_DELAY_KEYS = {kind: (f'{kind}_delay_min', f'{kind}_delay_max') for kind in ('scroll', 'like', 'topic')}
+
+
+@functools.lru_cache(maxsize=16)
+def _normalize_rate_items(items, base=None):
+    config = dict(base or DEFAULT_RATE_CONFIG)
+    for key, value in items:
+        try:
+            value = float(value)
+        except Exception:
+            continue
+        # 'inf'/'nan' 也能被 float() 解析，但会让 sleep/脚本超时出错：同样视为无效，保留默认值
+        if math.isfinite(value):
+            config[key] = max(0.0, value)
+    for min_key, max_key in _DELAY_KEYS.values():
         if config[max_key] < config[min_key]:
             config[max_key] = config[min_key]
-    return config
+    config['likes_per_scroll'] = int(config['likes_per_scroll'])
+    return tuple(config.items())
+
+
+def normalize_rate_config(raw, defaults=None):
+    """Convert arbitrary dict-like input into a sanitized rate configuration.
+
+    Invalid or missing values fall back to ``defaults`` (an already normalized
+    config), or to DEFAULT_RATE_CONFIG.
+    """
+    items = ()
+    if isinstance(raw, dict):
+        # 只取已知键；非数值/字符串的值本就无法转换，以 None 代替以便作为缓存键
+        items = tuple(
+            (key, raw[key] if isinstance(raw[key], (int, float, str)) else None)
+            for key in DEFAULT_RATE_CONFIG if key in raw
+        )
+    return dict(_normalize_rate_items(items, tuple(defaults.items()) if defaults else None))
+
+
+def _as_bool(value):
+    """'y'/'yes'/'true'/'1' -> True, 'n'/'no'/'false'/'0' -> False; other strings are invalid."""
+    if isinstance(value, str):
+        v = value.strip().lower()
+        if v in ('y', 'yes', 'true', '1'):
+            return True
+        if v in ('n', 'no', 'false', '0'):
+            return False
+        raise ValueError(value)
+    return bool(value)
+
+
+DEFAULT_BASE_URL = 'https://shuiyuan.sjtu.edu.cn'
+
+# settings.json 的基本字段：键 -> (类型转换, 默认值)；缺失、为空或转换失败时取默认值
+_SETTINGS_FIELDS = {
+    'base_url': (str, DEFAULT_BASE_URL),
+    'default_cycles': (lambda v: max(1, int(v)), 5),
+    'default_headless': (_as_bool, False),
+    'default_like': (_as_bool, True),
+    'chromedriver_path': (str, ''),
+}
+
+
+def normalize_settings(raw, defaults=None):
+    """Validate a settings dict in one pass; keys not listed here (e.g. blocked_urls) are kept as-is.
+
+    Invalid or missing values fall back to ``defaults`` (an already normalized
+    settings dict, e.g. the current one) or to the built-in defaults.
+    """
+    settings = dict(raw) if isinstance(raw, dict) else {}
+    for key, (coerce, default) in _SETTINGS_FIELDS.items():
+        if defaults:
+            default = defaults[key]
+        value = settings.get(key)
+        try:
+            settings[key] = default if value in (None, '') else coerce(value)
+        except (TypeError, ValueError):
+            settings[key] = default
+    settings['rate_control'] = normalize_rate_config(
+        settings.get('rate_control'), defaults['rate_control'] if defaults else None
+    )
+    return settings
 
 
 def apply_delay(rate_config, kind):
+    """Sleep a random pause of the given kind; rate_config comes from normalize_rate_config (None: no pause)."""
     if not rate_config:
         return
-    min_key = f'{kind}_delay_min'
-    max_key = f'{kind}_delay_max'
-    min_delay = rate_config.get(min_key, 0.0)
-    max_delay = rate_config.get(max_key, min_delay)
-    if min_delay < 0:
-        min_delay = 0.0
-    if max_delay < min_delay:
-        max_delay = min_delay
-    if max_delay <= 0:
-        return
+    min_key, max_key = _DELAY_KEYS[kind]
+    max_delay = rate_config[max_key]
+    if max_delay > 0:
+        time.sleep(random.uniform(rate_config[min_key], max_delay))
+
+
+SETTINGS_PATH = 'settings.json'
+
+
+# 配置文件加载/保存：按 (路径, mtime, 大小) 缓存解析结果，文件未变时不再读盘解析；
+# 运行中被手动修改（或另一个进程保存）后会自动重新读取。大小一并比较，
+# 以免在 mtime 精度较粗的文件系统上漏掉同一秒内的修改
+_SETTINGS_CACHE = {}
+
+
+def _settings_stamp(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def load_settings(path=SETTINGS_PATH):
+    """Return settings.json as a dict ({} if missing/invalid).
+
+    Each call returns a fresh copy, nested rate_control/chromedriver_paths/
+    blocked_urls included, so callers may modify it without touching the cache.
+    """
     try:
-        time.sleep(random.uniform(min_delay, max_delay))
-    except Exception:
-        pass
+        stamp = _settings_stamp(path)
+    except OSError:
+        _SETTINGS_CACHE.pop(path, None)
+        return {}
+    cached = _SETTINGS_CACHE.get(path)
+    if not cached or cached[0] != stamp:
+        try:
+            with open(path, 'rb') as f:
+                settings = _json_loads(f.read())
+        except Exception:
+            settings = {}
+        if not isinstance(settings, dict):
+            settings = {}
+        cached = _SETTINGS_CACHE[path] = (stamp, settings)
+    # settings.json 只嵌套一层（rate_control 等字典与 blocked_urls 列表），逐项复制即可
+    return {
+        key: value.copy() if isinstance(value, (dict, list)) else value
+        for key, value in cached[1].items()
+    }
+
+
+def save_settings(settings, path=SETTINGS_PATH, quiet=False):
+    try:
+        # 原子替换：信号触发 _cleanup 时也不会留下写了一半的配置
+        _write_json_atomic(path, settings)
+        # 刚写入的内容即缓存内容，下次读取无需重新解析
+        _SETTINGS_CACHE[path] = (_settings_stamp(path), dict(settings))
+        if not quiet:
+            print(f"✅ 已保存配置到 {path}")
+    except Exception as e:
+        _SETTINGS_CACHE.pop(path, None)
+        print(f"⚠️ 保存配置失败: {e}")
+
+
+def _first_existing(paths, mode=os.F_OK):
+    """Return the first of paths that exists (and passes os.access(mode)), in order.
+
+    A parent directory holding several candidates is listed once with scandir
+    and matched in memory; a lone candidate costs a single access() call.
+    """
+    per_parent = collections.Counter(os.path.dirname(p) for p in paths)
+    listings = {}
+    for p in paths:
+        parent, name = os.path.split(p)
+        if per_parent[parent] > 1:
+            if parent not in listings:
+                try:
+                    with os.scandir(parent) as it:
+                        listings[parent] = {e.name for e in it}
+                except OSError:
+                    listings[parent] = set()
+            if name not in listings[parent]:
+                continue
+        if os.access(p, mode):
+            return p
+    return None
 
 
+@functools.lru_cache(maxsize=None)
 def find_local_chromedriver(chrome_version_major: Optional[int]) -> Optional[str]:
     """Locate a local chromedriver without network.
-    Checks settings.json, CHROMEDRIVER env, project .drivers/, and common paths.
+    Checks settings.json (explicit path, then the per-major webdriver_manager
+    cache), CHROMEDRIVER env, project .drivers/, and common paths.
     """
-    # Try settings.json in CWD
+    # Try settings.json in CWD: an explicit path first, then the driver webdriver_manager
+    # installed last time for this Chrome major (so the uc path reuses it as well).
+    # 主版本未知时不复用记录：无法判断 Chrome 升级后它是否仍匹配
     try:
-        cfg_path = os.path.join(os.path.abspath(os.getcwd()), 'settings.json')
-        if os.path.exists(cfg_path):
-            with open(cfg_path, 'r', encoding='utf-8') as f:
-                s = json.load(f)
-                p = (s.get('chromedriver_path') or '').strip()
-                if p and os.path.exists(p):
-                    return p
+        settings = load_settings()
+        p = (settings.get('chromedriver_path') or '').strip()
+        if p and os.path.exists(p):
+            return p
+        if chrome_version_major is not None:
+            p = (settings.get('chromedriver_paths') or {}).get(str(chrome_version_major))
+            if p and os.path.exists(p):
+                return p
     except Exception:
         pass
 
@@ -109,13 +304,7 @@ def find_local_chromedriver(chrome_version_major: Optional[int]) -> Optional[str
         os.path.expanduser('~/bin/chromedriver'),
     ])
 
-    for c in candidates:
-        try:
-            if os.path.exists(c) and os.access(c, os.X_OK):
-                return c
-        except Exception:
-            continue
-    return None
+    return _first_existing(candidates, os.X_OK)
 
 
 def install_matching_chromedriver(chrome_version_full: Optional[str], chrome_version_major: Optional[int]):
@@ -123,6 +312,19 @@ def install_matching_chromedriver(chrome_version_full: Optional[str], chrome_ver
     local = find_local_chromedriver(chrome_version_major)
     if local:
         return local
+    # 上次由 webdriver_manager 安装的同主版本驱动已由 find_local_chromedriver 复用；
+    # 这里安装后按主版本记录，下次跳过其联网/校验（主版本未知时不记录）
+    path = _install_chromedriver_with_manager(chrome_version_full, chrome_version_major)
+    if chrome_version_major is not None:
+        settings = load_settings()
+        settings['chromedriver_paths'] = dict(
+            settings.get('chromedriver_paths') or {}, **{str(chrome_version_major): path}
+        )
+        save_settings(settings, quiet=True)
+    return path
+
+
+def _install_chromedriver_with_manager(chrome_version_full: Optional[str], chrome_version_major: Optional[int]):
     try:
         from webdriver_manager.chrome import ChromeDriverManager
     except Exception as exc:
@@ -157,13 +359,46 @@ def install_matching_chromedriver(chrome_version_full: Optional[str], chrome_ver
     raise RuntimeError("无法自动安装匹配的 ChromeDriver")
 
 
+# Outputs like: "Google Chrome 139.0.7258.128" or "Chromium 119.0..."
+_VERSION_RE = re.compile(r"(\d+\.\d+\.\d+\.\d+)")
+# 站点 host 转为安全的目录名
+_HOST_SAFE_RE = re.compile(r"[^a-zA-Z0-9_.-]")
+
+# 会话目录根：导入时解析一次（之后即使工作目录变化也保持不变）
+_PROFILE_ROOT = os.path.abspath('.chrome-profiles')
+CHROME_VERSION_CACHE = os.path.join(_PROFILE_ROOT, 'chrome-version.json')
+
+
+def _load_cached_chrome_version(chrome_path):
+    if not chrome_path:
+        return None
+    try:
+        with open(CHROME_VERSION_CACHE, 'rb') as f:
+            data = _json_loads(f.read())
+        if data.get('path') == chrome_path and data.get('mtime') == os.stat(chrome_path).st_mtime:
+            return data.get('version') or None
+    except Exception:
+        pass
+    return None
+
+
+def _save_cached_chrome_version(chrome_path, version):
+    try:
+        data = {'path': chrome_path, 'mtime': os.stat(chrome_path).st_mtime, 'version': version}
+        os.makedirs(os.path.dirname(CHROME_VERSION_CACHE), exist_ok=True)
+        _write_json_atomic(CHROME_VERSION_CACHE, data)
+    except Exception:
+        pass
+
+
+@functools.lru_cache(maxsize=None)
 def get_local_chrome_version(chrome_path=None):
     """Return full Chrome version string like '139.0.7258.128' if detectable.
-    Prefer Windows registry on Windows; otherwise try `chrome --version`.
+    Prefer Windows registry on Windows; then the on-disk cache, the macOS
+    Info.plist or Linux product_version file, and finally `chrome --version`.
     """
-    system = platform.system().lower()
     # Windows: query registry BLBeacon version first (most reliable)
-    if system == 'windows':
+    if _SYSTEM == 'windows':
         try:
             import winreg  # type: ignore
             for root in (winreg.HKEY_CURRENT_USER, winreg.HKEY_LOCAL_MACHINE):
@@ -177,6 +412,36 @@ def get_local_chrome_version(chrome_path=None):
         except Exception:
             pass
 
+    # 按二进制路径+修改时间缓存到磁盘：Chrome 未升级时无需再启动子进程探测
+    cached = _load_cached_chrome_version(chrome_path)
+    if cached:
+        return cached
+
+    # macOS: read the app bundle's Info.plist (no subprocess)
+    if _SYSTEM == 'darwin' and chrome_path:
+        try:
+            import plistlib
+            plist = os.path.join(os.path.dirname(os.path.dirname(chrome_path)), 'Info.plist')
+            with open(plist, 'rb') as f:
+                ver = plistlib.load(f).get('CFBundleShortVersionString')
+            if ver:
+                _save_cached_chrome_version(chrome_path, ver)
+                return ver
+        except Exception:
+            pass
+
+    # Linux: some packages ship a plain-text product_version next to the real binary
+    if _SYSTEM == 'linux' and chrome_path:
+        try:
+            real_dir = os.path.dirname(os.path.realpath(chrome_path))
+            with open(os.path.join(real_dir, 'product_version'), encoding='utf-8') as f:
+                m = _VERSION_RE.search(f.read(64))
+            if m:
+                _save_cached_chrome_version(chrome_path, m.group(1))
+                return m.group(1)
+        except OSError:
+            pass
+
     # Fallback: invoke chrome binary with --version
     candidates = []
     if chrome_path and os.path.exists(chrome_path):
@@ -186,37 +451,80 @@ def get_local_chrome_version(chrome_path=None):
     candidates.append('google-chrome')
     for bin_path in candidates:
         try:
-            out = subprocess.check_output([bin_path, '--version'], stderr=subprocess.STDOUT, timeout=5)
-            s = out.decode(errors='ignore').strip()
-            # Outputs like: "Google Chrome 139.0.7258.128" or "Chromium 119.0..."
-            m = re.search(r"(\d+\.\d+\.\d+\.\d+)", s)
+            # --version only prints a string; 2s still covers a cold disk
+            res = subprocess.run(
+                [bin_path, '--version'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                text=True, errors='ignore', timeout=2, check=False,
+            )
+            m = _VERSION_RE.search(res.stdout or '')
             if m:
+                if bin_path == chrome_path:
+                    _save_cached_chrome_version(chrome_path, m.group(1))
                 return m.group(1)
         except Exception:
             continue
     return None
 
 
+# 运行所需的模块；uc 推迟到 setup_driver 才真正导入
+_REQUIRED_MODULES = ('selenium', 'undetected_chromedriver', 'webdriver_manager.chrome')
+
+
 def check_dependencies():
+    # 只查找模块是否存在，不执行其顶层代码（undetected_chromedriver 导入时有副作用且较慢）
     try:
-        import selenium  # noqa: F401
-        import undetected_chromedriver  # noqa: F401
-        from webdriver_manager.chrome import ChromeDriverManager  # noqa: F401
-        return True
+        return all(find_spec(name) is not None for name in _REQUIRED_MODULES)
     except Exception:
         return False
 
 
+def _chrome_path_from_registry():
+    """Windows: App Paths entry written by the Chrome installer (covers per-user installs)."""
+    try:
+        import winreg  # type: ignore
+        for root in (winreg.HKEY_LOCAL_MACHINE, winreg.HKEY_CURRENT_USER):
+            try:
+                with winreg.OpenKey(root, r"Software\Microsoft\Windows\CurrentVersion\App Paths\chrome.exe") as k:
+                    val, _ = winreg.QueryValueEx(k, None)
+                    if isinstance(val, str) and val and os.path.exists(val):
+                        return val
+            except OSError:
+                pass
+    except Exception:
+        pass
+    return None
+
+
+def _chrome_path_from_spotlight():
+    """macOS: locate Chrome.app anywhere via Spotlight when it is not in /Applications."""
+    try:
+        out = subprocess.check_output(
+            ['mdfind', 'kMDItemCFBundleIdentifier == "com.google.Chrome"'],
+            stderr=subprocess.DEVNULL, timeout=2,
+        )
+        for app in out.decode(errors='ignore').splitlines():
+            p = os.path.join(app.strip(), 'Contents', 'MacOS', 'Google Chrome')
+            if os.path.exists(p):
+                return p
+    except Exception:
+        pass
+    return None
+
+
+@functools.lru_cache(maxsize=1)
 def get_chrome_executable_path():
-    system = platform.system().lower()
+    if _SYSTEM == 'windows':
+        found = _chrome_path_from_registry()
+        if found:
+            return found
     candidates = []
-    if system == 'windows':
+    if _SYSTEM == 'windows':
         candidates = [
             r"C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe",
             r"C:\\Program Files (x86)\\Google\\Chrome\\Application\\chrome.exe",
             os.path.expanduser(r"~\\AppData\\Local\\Google\\Chrome\\Application\\chrome.exe"),
         ]
-    elif system == 'darwin':
+    elif _SYSTEM == 'darwin':
         candidates = [
             "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome",
             os.path.expanduser("~/Applications/Google Chrome.app/Contents/MacOS/Google Chrome"),
@@ -235,55 +543,319 @@ def get_chrome_executable_path():
             "/usr/bin/chromium-browser",
             "/snap/bin/chromium",
         ]
-    for p in candidates:
-        if os.path.exists(p):
-            return p
+    found = _first_existing(candidates)
+    if found:
+        return found
+    if _SYSTEM == 'darwin':
+        return _chrome_path_from_spotlight()
     return None
 
 
-def setup_driver(headless=False, user_data_dir=None):
-    """优先使用 undetected_chromedriver，失败时回退到标准 webdriver"""
-    chrome_path = get_chrome_executable_path()
-    system = platform.system().lower()
-    chrome_version_full = get_local_chrome_version(chrome_path)
+def _headless_flags(chrome_version_full=None):
+    # Spoof UA in headless to avoid simplified/blocked pages
+    ua_ver = chrome_version_full or "120.0.0.0"
+    return [
+        "--headless=new",
+        f"--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+        f"AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{ua_ver} Safari/537.36",
+    ]
+
+
+def _profile_flags(user_data_dir):
+    # 持久用户数据目录（复用登录状态）
+    return [
+        f"--user-data-dir={user_data_dir}",
+        "--profile-directory=Default",
+        "--no-first-run",
+        "--no-default-browser-check",
+    ]
+
+
+def _chrome_flags(system, headless=False, chrome_version_full=None, user_data_dir=None, lite=False):
+    """Command-line flags shared by the uc and standard webdriver paths (deduplicated, order kept)."""
+    flags = [
+        "--no-sandbox",
+        "--disable-dev-shm-usage",
+        "--disable-blink-features=AutomationControlled",
+        "--window-size=1920,1080",
+    ]
+    # Headless stability tweaks
+    if system in ('linux', 'windows'):
+        flags.append("--disable-gpu")
+    if headless:
+        flags.extend(_headless_flags(chrome_version_full))
+    if user_data_dir:
+        flags.extend(_profile_flags(user_data_dir))
+    if lite:
+        flags.extend(LITE_FLAGS)
+    return list(dict.fromkeys(flags))
+
+
+# 统计/广告请求会让页面持续变动、拖慢静止判定；在浏览器网络层直接拦截。
+# 可在 settings.json 中用 "blocked_urls" 覆盖（设为 [] 关闭）
+DEFAULT_BLOCKED_URLS = [
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*doubleclick.net*",
+    "*googlesyndication.com*",
+    "*hm.baidu.com*",
+    "*cnzz.com*",
+]
+
+
+# 标准 webdriver 会暴露 navigator.webdriver=true（undetected_chromedriver 已自行处理）
+_STEALTH_JS = "Object.defineProperty(Navigator.prototype, 'webdriver', {get: () => undefined});"
+
+
+# --lite：额外拦截图片与字体（不拦截 CSS，否则点赞按钮布局与命中检测会失效）
+LITE_BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg",
+    "*.woff", "*.woff2", "*.ttf",
+]
+# 图片开关只作为本次启动的命令行参数：不能写成 prefs，undetected_chromedriver 与 chromedriver
+# 会把 prefs 合并进持久会话目录的 Default/Preferences，之后不带 --lite 的运行也会不显示图片
+LITE_FLAGS = ["--blink-settings=imagesEnabled=false"]
+
+
+# 关闭 CSS 动画/过渡与平滑滚动：scrollBy 立即生效，懒加载与 DOM 静止判定不必等动画结束
+_NO_ANIMATION_JS = """
+(function () {
+    const css = '*, *::before, *::after { animation-duration: 0s !important; animation-delay: 0s !important; '
+        + 'transition: none !important; scroll-behavior: auto !important; }';
+    const add = () => {
+        const s = document.createElement('style');
+        s.textContent = css;
+        (document.head || document.documentElement).appendChild(s);
+    };
+    if (document.documentElement) {
+        add();
+    } else {
+        document.addEventListener('DOMContentLoaded', add, {once: true});
+    }
+})();
+"""
+
+
+def _apply_cdp_setup(driver, stealth=False, lite=False):
+    """Register in-page helpers once per browser so every new document gets them before its own scripts run."""
+    if stealth:
+        try:
+            driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": _STEALTH_JS})
+        except Exception:
+            pass
+    try:
+        driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": _DOM_OBSERVER_JS})
+    except Exception:
+        # CDP unavailable: scroll_and_read injects the observer on demand
+        pass
+    try:
+        driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": _NO_ANIMATION_JS})
+        # Web Animations API 动画（不受上面的 CSS 影响）加速播放
+        driver.execute_cdp_cmd("Animation.enable", {})
+        driver.execute_cdp_cmd("Animation.setPlaybackRate", {"playbackRate": 16})
+    except Exception:
+        pass
+    try:
+        blocked = list(load_settings().get('blocked_urls', DEFAULT_BLOCKED_URLS))
+        if lite:
+            blocked.extend(LITE_BLOCKED_URLS)
+        if blocked:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(blocked)})
+    except Exception:
+        pass
+
+
+def _debug_port_open(port: int) -> bool:
+    try:
+        with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+            return True
+    except OSError:
+        return False
+
+
+CDP_STATE_FILE = 'cdp.json'
+
+
+def read_attach_port(user_data_dir, headless, lite):
+    """Return the debug port recorded in the profile if that Chrome is still serving CDP.
+
+    The browser must have been started in the requested headless/lite mode;
+    otherwise (or if the file predates the mode record) None is returned, so
+    a run that needs a visible window never lands in a headless browser.
+    """
+    try:
+        with open(os.path.join(user_data_dir, CDP_STATE_FILE), 'rb') as f:
+            state = _json_loads(f.read())
+        port = int(state['port'])
+        # 只在有端口记录时才需要：urllib.request（连带 http.client、email）导入较慢，不放在模块顶层
+        import urllib.request
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/json/version', timeout=0.3):
+            pass
+    except Exception:
+        return None
+    if (state.get('headless'), state.get('lite')) != (bool(headless), bool(lite)):
+        print(f"ℹ️ 常驻 Chrome（调试端口 {port}）的无头/省流模式与本次不同，不自动连接")
+        return None
+    return port
+
+
+def _attach_driver(port, chrome_path, chrome_flags, chrome_version_full, chrome_version_major,
+                   headless=False, lite=False, user_data_dir=None):
+    """Connect to a Chrome listening on 127.0.0.1:port, launching a detached one first if needed.
+
+    The browser outlives this process, so later runs attach to the warm
+    instance (and its login cookies) instead of starting Chrome again.
+    """
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+
+    if not _debug_port_open(port):
+        if not chrome_path:
+            raise RuntimeError("未找到 Chrome，可先手动以 --remote-debugging-port 启动后再使用 --attach")
+        kwargs = {'start_new_session': True} if os.name != 'nt' else {
+            'creationflags': getattr(subprocess, 'DETACHED_PROCESS', 0) | getattr(subprocess, 'CREATE_NEW_PROCESS_GROUP', 0)
+        }
+        subprocess.Popen(
+            [chrome_path, f'--remote-debugging-port={port}'] + chrome_flags,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, **kwargs
+        )
+        deadline = time.time() + 15
+        while not _debug_port_open(port):
+            if time.time() > deadline:
+                raise RuntimeError(f"Chrome 调试端口 {port} 未就绪")
+            time.sleep(0.2)
+        print(f"🧭 已启动常驻 Chrome（调试端口 {port}）")
+        # 记录端口与启动模式：之后不带 --attach、且模式相同的运行会自动连接这个浏览器
+        if user_data_dir:
+            try:
+                _write_json_atomic(
+                    os.path.join(user_data_dir, CDP_STATE_FILE),
+                    {'port': port, 'headless': bool(headless), 'lite': bool(lite)},
+                )
+            except Exception:
+                pass
+    else:
+        print(f"🧭 连接已运行的 Chrome（调试端口 {port}）")
+
+    options = Options()
+    options.add_experimental_option("debuggerAddress", f"127.0.0.1:{port}")
+    options.page_load_strategy = 'eager'
+    driver_path = install_matching_chromedriver(chrome_version_full, chrome_version_major)
+    driver = webdriver.Chrome(service=Service(driver_path), options=options)
+    # 在独立标签页中运行，不占用浏览器里已打开的页面；记下句柄，结束时只关闭这个标签页
+    driver.attach_tab = None
+    try:
+        driver.switch_to.new_window('tab')
+        driver.attach_tab = driver.current_window_handle
+    except Exception:
+        pass
+    _apply_cdp_setup(driver, stealth=True, lite=lite)
+    return driver
+
+
+_SINGLETON_FILES = ('SingletonLock', 'SingletonCookie', 'SingletonSocket')
+
+
+def _clear_stale_profile_lock(user_data_dir):
+    """Remove Chrome's Singleton* files left by a killed browser, and pending crash dumps.
+
+    SingletonLock is a symlink to '<host>-<pid>'; it is only removed when it
+    names this host and that pid is gone, so a Chrome still using the profile
+    is never disturbed. Otherwise the next launch on the profile can stall.
+    """
+    if not user_data_dir or _SYSTEM == 'windows':
+        return
+    try:
+        host, _, pid = os.readlink(os.path.join(user_data_dir, 'SingletonLock')).rpartition('-')
+    except OSError:
+        return
+    if host != socket.gethostname():
+        return
+    try:
+        os.kill(int(pid), 0)
+        return
+    except ProcessLookupError:
+        pass
+    except (OSError, ValueError):
+        return
+    for name in _SINGLETON_FILES:
+        try:
+            os.unlink(os.path.join(user_data_dir, name))
+        except OSError:
+            pass
+    # 强制结束会积累待上传的崩溃转储
+    try:
+        with os.scandir(os.path.join(user_data_dir, 'Crashpad', 'pending')) as it:
+            for e in it:
+                if e.is_file():
+                    os.unlink(e.path)
+    except OSError:
+        pass
+
+
+def _clear_lite_prefs(user_data_dir):
+    """Drop the image-blocking pref that earlier --lite runs merged into the profile's Preferences."""
+    if not user_data_dir:
+        return
+    path = os.path.join(user_data_dir, 'Default', 'Preferences')
+    try:
+        with open(path, 'rb') as f:
+            prefs = _json_loads(f.read())
+        if prefs['profile']['managed_default_content_settings'].pop('images', None) is not None:
+            _write_json_atomic(path, prefs)
+    except Exception:
+        pass
+
+
+def setup_driver(headless=False, user_data_dir=None, lite=False, attach_port=None):
+    """优先使用 undetected_chromedriver，失败时回退到标准 webdriver
+
+    attach_port: 连接（必要时先启动）监听该调试端口的常驻 Chrome，而不是每次新开浏览器。
+    """
+    # 导入 undetected_chromedriver 较慢（数百毫秒），与查找 Chrome 路径/版本（文件探测、
+    # 可能的 chrome --version 子进程）互不依赖：放到后台线程并行进行。
+    # 导入失败时由下方的 import 重新抛出并回退到标准 webdriver；连接模式不需要 uc
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        if not attach_port:
+            pool.submit(import_module, 'undetected_chromedriver')
+        chrome_path = get_chrome_executable_path()
+        chrome_version_full = get_local_chrome_version(chrome_path)
     chrome_version_major = None
     try:
         if chrome_version_full:
             chrome_version_major = int(chrome_version_full.split('.')[0])
     except Exception:
         chrome_version_major = None
+    chrome_flags = _chrome_flags(_SYSTEM, headless, chrome_version_full, user_data_dir, lite)
+
+    if attach_port:
+        return _attach_driver(
+            attach_port, chrome_path, chrome_flags, chrome_version_full, chrome_version_major,
+            headless=headless, lite=lite, user_data_dir=user_data_dir,
+        )
+
+    # 上次被强制结束的浏览器可能留下锁文件，复用同一资料目录时会卡住启动
+    _clear_stale_profile_lock(user_data_dir)
+    # --lite 改用启动参数后，清掉旧版本写进会话目录的“不显示图片”设置
+    _clear_lite_prefs(user_data_dir)
 
     # 首选：undetected_chromedriver
     try:
         import undetected_chromedriver as uc
         uc_options = uc.ChromeOptions()
-        uc_options.add_argument("--no-sandbox")
-        uc_options.add_argument("--disable-dev-shm-usage")
-        uc_options.add_argument("--disable-blink-features=AutomationControlled")
-        uc_options.add_argument("--window-size=1920,1080")
-        # Headless stability tweaks
-        if system in ('linux', 'windows'):
-            uc_options.add_argument("--disable-gpu")
-        if headless:
-            uc_options.add_argument("--headless=new")
-            # Spoof UA in headless to avoid simplified/blocked pages
-            ua_ver = chrome_version_full or "120.0.0.0"
-            uc_options.add_argument(
-                f"--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-                f"AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{ua_ver} Safari/537.36"
-            )
+        for flag in chrome_flags:
+            uc_options.add_argument(flag)
         if chrome_path:
             uc_options.binary_location = chrome_path
-        # 持久用户数据目录（复用登录状态）
-        if user_data_dir:
-            uc_options.add_argument(f"--user-data-dir={user_data_dir}")
-            uc_options.add_argument("--profile-directory=Default")
-            uc_options.add_argument("--no-first-run")
-            uc_options.add_argument("--no-default-browser-check")
+        # driver.get 在 DOMContentLoaded 后即返回，不等第三方资源；后续均有显式等待
+        uc_options.page_load_strategy = 'eager'
 
         # Attempt to use local chromedriver if available (offline)
         local_driver_path = find_local_chromedriver(chrome_version_major)
-        uc_use_subprocess = (system == 'darwin')
+        uc_use_subprocess = (_SYSTEM == 'darwin')
         driver = uc.Chrome(
             options=uc_options,
             # Pin to detected major version if available to avoid mismatch
@@ -299,6 +871,7 @@ def setup_driver(headless=False, user_data_dir=None):
             print(f"🧭 Chrome 版本: {chrome_version_full}")
         if local_driver_path:
             print(f"🧭 使用本地 chromedriver: {local_driver_path}")
+        _apply_cdp_setup(driver, lite=lite)
         return driver
     except Exception as e:
         print(f"⚠️ undetected_chromedriver 启动失败: {e}")
@@ -310,39 +883,23 @@ def setup_driver(headless=False, user_data_dir=None):
         from selenium.webdriver.chrome.options import Options
 
         options = Options()
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_argument("--window-size=1920,1080")
-        # Headless stability tweaks
-        if system in ('linux', 'windows'):
-            options.add_argument("--disable-gpu")
-        if headless:
-            options.add_argument("--headless=new")
-            ua_ver = chrome_version_full or "120.0.0.0"
-            options.add_argument(
-                f"--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-                f"AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{ua_ver} Safari/537.36"
-            )
+        for flag in chrome_flags:
+            options.add_argument(flag)
         # Reduce automation fingerprints for standard webdriver fallback
         try:
-            options.add_argument("--disable-blink-features=AutomationControlled")
             options.add_experimental_option("excludeSwitches", ["enable-automation"])
             options.add_experimental_option('useAutomationExtension', False)
         except Exception:
             pass
         if chrome_path:
             options.binary_location = chrome_path
-        # 持久用户数据目录（复用登录状态）
-        if user_data_dir:
-            options.add_argument(f"--user-data-dir={user_data_dir}")
-            options.add_argument("--profile-directory=Default")
-            options.add_argument("--no-first-run")
-            options.add_argument("--no-default-browser-check")
+        options.page_load_strategy = 'eager'
 
-        # If we detected local Chrome version, request matching driver version
-        driver_path = find_local_chromedriver(chrome_version_major) or install_matching_chromedriver(chrome_version_full, chrome_version_major)
+        # Local chromedriver first (install_matching_chromedriver checks it), then a matching download
+        driver_path = install_matching_chromedriver(chrome_version_full, chrome_version_major)
         service = Service(driver_path)
         driver = webdriver.Chrome(service=service, options=options)
+        _apply_cdp_setup(driver, stealth=True, lite=lite)
         return driver
     except Exception as e:
         print(f"❌ 标准 webdriver 也启动失败: {e}")
@@ -358,15 +915,110 @@ def setup_driver(headless=False, user_data_dir=None):
 # -----------------------
 # Cross-platform cleanup
 # -----------------------
-_CLEANUP_CTX = {
-    'driver': None,            # type: Optional[object]
-    'user_data_dir': None,     # type: Optional[str]
-    'handlers_installed': False,
-    'win_ctrl_handler': None,
-}
+_CLEANUP_CTX = SimpleNamespace(
+    driver=None,               # type: Optional[object]
+    user_data_dir=None,        # type: Optional[str]
+    attached=False,            # 连接的是常驻 Chrome（--attach）：只断开，不关闭/不结束进程
+    browser_pid=None,          # 启动时记录，清理时只结束这些进程树，无需扫描全部进程
+    service_pid=None,
+    handlers_installed=False,
+    win_ctrl_handler=None,
+)
+
+
+# SIGTERM 后最多等待的秒数，仍未退出的进程再 SIGKILL。driver.quit() 已先正常关闭过浏览器，
+# 走到这里的多是残留进程，无需久等
+_KILL_GRACE_S = 1.0
+
+
+def _taskkill_all(arg_lists, timeout=5):
+    """Windows: run several taskkill commands concurrently and wait for them together."""
+    procs = []
+    for args in arg_lists:
+        try:
+            procs.append(subprocess.Popen(['taskkill', '/F'] + args,
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        except OSError:
+            continue
+    deadline = time.time() + timeout
+    for p in procs:
+        try:
+            p.wait(timeout=max(0.1, deadline - time.time()))
+        except subprocess.TimeoutExpired:
+            pass
+
+
+def _terminate_tree(roots, grace=_KILL_GRACE_S):
+    """Terminate roots and all their descendants; kill whatever outlives the grace period.
+
+    psutil maps terminate()/kill() to SIGTERM/SIGKILL on POSIX and to
+    TerminateProcess on Windows.
+    """
+    import psutil  # type: ignore
+
+    procs = {}
+    for root in roots:
+        try:
+            for child in root.children(recursive=True):
+                procs[child.pid] = child
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+        procs[root.pid] = root
+    procs = list(procs.values())
+    for p in procs:
+        try:
+            p.terminate()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    _, alive = psutil.wait_procs(procs, timeout=grace)
+    for p in alive:
+        try:
+            p.kill()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+
+
+def _signal_pids(pids, grace=_KILL_GRACE_S):
+    """Without psutil: stop the recorded browser/chromedriver pids in-process.
+
+    POSIX sends SIGTERM to each pid's process group when it is not our own
+    (Chrome's helpers share it), then SIGKILL to whatever outlives the grace
+    period. Windows uses taskkill /T on exactly these pids.
+    """
+    pids = [pid for pid in pids if pid]
+    if _SYSTEM == 'windows':
+        _taskkill_all([['/T', '/PID', str(pid)] for pid in pids])
+        return
+    own_pgid = os.getpgid(0)
+
+    def send(pid, sig):
+        if sig == 0:
+            # 我们自己启动的进程退出后会成为僵尸：先回收，否则 kill(pid, 0) 仍然成功
+            try:
+                if os.waitpid(pid, os.WNOHANG)[0] == pid:
+                    return False
+            except OSError:
+                pass
+        try:
+            pgid = os.getpgid(pid)
+            if pgid != own_pgid:
+                os.killpg(pgid, sig)
+            else:
+                os.kill(pid, sig)
+            return True
+        except OSError:
+            return False
+
+    alive = [pid for pid in pids if send(pid, signal.SIGTERM)]
+    deadline = time.time() + grace
+    while alive and time.time() < deadline:
+        time.sleep(0.1)
+        alive = [pid for pid in alive if send(pid, 0)]
+    for pid in alive:
+        send(pid, signal.SIGKILL)
 
 
-def _kill_chrome_for_profile(user_data_dir: Optional[str]):
+def _kill_chrome_for_profile(user_data_dir: Optional[str], pids=()):
     if not user_data_dir:
         return
     try:
@@ -375,45 +1027,48 @@ def _kill_chrome_for_profile(user_data_dir: Optional[str]):
         psutil = None
 
     try:
-        system = platform.system().lower()
-        if psutil:
-            targets = []
-            for p in psutil.process_iter(['pid', 'name', 'cmdline']):
+        if psutil and any(pids):
+            # Known browser/chromedriver pids: stop just those trees
+            roots = []
+            for pid in pids:
+                if not pid:
+                    continue
                 try:
-                    name = (p.info.get('name') or '').lower()
-                    cmdline = p.info.get('cmdline') or []
-                    cmd = ' '.join(cmdline)
-                    if ('chrome' in name or 'google chrome' in name) and (user_data_dir in cmd):
-                        targets.append(p)
+                    roots.append(psutil.Process(pid))
                 except (psutil.NoSuchProcess, psutil.AccessDenied):
                     continue
-            # Graceful terminate, then kill if needed
-            for p in targets:
-                try:
-                    p.terminate()
-                except Exception:
-                    pass
-            if targets:
-                psutil.wait_procs(targets, timeout=5)
-            for p in targets:
-                try:
-                    if p.is_running():
-                        p.kill()
-                except Exception:
-                    pass
-            # Also try to stop stray chromedriver processes (best effort)
+            _terminate_tree(roots)
+        elif psutil:
+            # No pids recorded: one pass over the process table for this profile's
+            # Chrome, plus the chromedriver that launched it (best effort).
+            # Only name is prefetched; cmdline (a /proc read per process) is fetched
+            # lazily for Chrome-named processes alone. chromedriver processes are
+            # never matched by name alone: they may belong to other --workers,
+            # other users or unrelated tools
+            profile_arg = f'--user-data-dir={user_data_dir}'
+            roots = {}
             for p in psutil.process_iter(['pid', 'name']):
                 try:
                     name = (p.info.get('name') or '').lower()
-                    if 'chromedriver' in name:
-                        p.terminate()
-                except Exception:
+                    if 'chrome' not in name or 'chromedriver' in name:
+                        continue
+                    with p.oneshot():
+                        if profile_arg not in p.cmdline():
+                            continue
+                    roots[p.pid] = p
+                    for parent in p.parents():
+                        if 'chromedriver' in parent.name().lower():
+                            roots[parent.pid] = parent
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
                     continue
+            _terminate_tree(list(roots.values()))
+        elif any(pids):
+            # Pids known but no psutil: signal them directly instead of pattern-matching with pkill
+            _signal_pids(pids)
         else:
-            if system == 'windows':
+            if _SYSTEM == 'windows':
                 # Best-effort: this may close all Chrome instances
-                subprocess.call(['taskkill', '/F', '/IM', 'chrome.exe'])
-                subprocess.call(['taskkill', '/F', '/IM', 'chromedriver.exe'])
+                _taskkill_all([['/IM', 'chrome.exe'], ['/IM', 'chromedriver.exe']])
             else:
                 # Narrow down by profile dir to avoid killing user's real Chrome
                 try:
@@ -426,25 +1081,208 @@ def _kill_chrome_for_profile(user_data_dir: Optional[str]):
         pass
 
 
-def _cleanup():
-    drv = _CLEANUP_CTX.get('driver')
-    user_data_dir = _CLEANUP_CTX.get('user_data_dir')
-    # Try closing the webdriver session first
-    try:
-        if drv:
+def _quit_driver():
+    # Take the driver out of the context first so it is never quit twice
+    drv = _CLEANUP_CTX.driver
+    _CLEANUP_CTX.driver = None
+    if not drv:
+        return
+    if _CLEANUP_CTX.attached:
+        # Leave the shared browser running; close only the tab we opened, then stop our chromedriver
+        tab = getattr(drv, 'attach_tab', None)
+        if tab:
             try:
-                drv.quit()
+                if drv.current_window_handle != tab:
+                    drv.switch_to.window(tab)
+                drv.close()
             except Exception:
                 pass
+        drv.service.stop()
+    else:
+        drv.quit()
+
+
+# 本次启动的浏览器/chromedriver pid 同时写入会话目录：进程被强杀（未执行清理）时，
+# 下次启动可据此只结束这些残留进程，而不必扫描全部进程
+PIDS_FILE = 'chrome.pids'
+
+
+def _pid_is_chrome(pid):
+    """True if pid is alive and is a Chrome/chromedriver process (guards against pid reuse)."""
+    try:
+        with open(f'/proc/{pid}/comm', encoding='utf-8') as f:
+            return 'chrom' in f.read().lower()
+    except OSError:
+        pass
+    if os.path.isdir('/proc'):
+        # Linux: no comm entry means the process is gone
+        return False
+    try:
+        import psutil  # type: ignore
+        return 'chrom' in psutil.Process(pid).name().lower()
+    except Exception:
+        # 无法核实进程名时不冒险
+        return False
+
+
+def _proc_cmdline(pid):
+    """Command-line arguments of pid ([] if unavailable)."""
+    try:
+        with open(f'/proc/{pid}/cmdline', 'rb') as f:
+            return f.read().decode('utf-8', 'ignore').split('\0')
+    except OSError:
+        if os.path.isdir('/proc'):
+            return []
+    try:
+        import psutil  # type: ignore
+        return psutil.Process(pid).cmdline()
+    except Exception:
+        return []
+
+
+def _proc_create_time(pid):
+    """Start time of pid as a Unix timestamp (None if unavailable)."""
+    try:
+        import psutil  # type: ignore
+        return psutil.Process(pid).create_time()
+    except ImportError:
+        pass
+    except Exception:
+        return None
+    try:
+        # Linux 无 psutil：/proc/<pid>/stat 第 22 个字段为自开机起的时钟节拍数
+        with open(f'/proc/{pid}/stat', encoding='utf-8') as f:
+            ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/stat', encoding='utf-8') as f:
+            btime = next(int(line.split()[1]) for line in f if line.startswith('btime'))
+        return btime + ticks / os.sysconf('SC_CLK_TCK')
+    except Exception:
+        return None
+
+
+def _write_pid_file(user_data_dir, pids):
+    """Record (browser_pid, service_pid) for the profile, one per line (0 if unknown)."""
+    try:
+        with open(os.path.join(user_data_dir, PIDS_FILE), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(str(pid or 0) for pid in pids))
+    except Exception:
+        pass
+
+
+def _pop_pid_file(user_data_dir):
+    """Read and delete the profile's pid file; return the recorded pids that are still ours.
+
+    The file may predate a reboot, so a matching process name is not enough:
+    the browser must run with this --user-data-dir, and chromedriver must
+    have started before the file was written.
+    """
+    if not user_data_dir:
+        return []
+    path = os.path.join(user_data_dir, PIDS_FILE)
+    try:
+        with open(path, encoding='utf-8') as f:
+            written_at = os.fstat(f.fileno()).st_mtime
+            lines = f.read().split()
+        os.unlink(path)
+    except OSError:
+        return []
+    profile = os.path.normcase(os.path.abspath(user_data_dir))
+    ours = []
+    for idx, line in enumerate(lines[:2]):
+        pid = int(line) if line.isdigit() else 0
+        if not pid or not _pid_is_chrome(pid):
+            continue
+        if idx == 0:
+            ok = any(
+                arg.startswith('--user-data-dir=')
+                and os.path.normcase(os.path.abspath(arg.split('=', 1)[1])) == profile
+                for arg in _proc_cmdline(pid)
+            )
+        else:
+            created = _proc_create_time(pid)
+            ok = created is not None and created <= written_at
+        if ok:
+            ours.append(pid)
+    return ours
+
+
+def _kill_profile_processes():
+    # Ensure Chrome for this profile is not left hanging
+    user_data_dir = _CLEANUP_CTX.user_data_dir
+    pids = (_CLEANUP_CTX.browser_pid, _CLEANUP_CTX.service_pid)
+    _CLEANUP_CTX.user_data_dir = None
+    _CLEANUP_CTX.browser_pid = _CLEANUP_CTX.service_pid = None
+    if not _CLEANUP_CTX.attached:
+        recorded = _pop_pid_file(user_data_dir)
+        _kill_chrome_for_profile(user_data_dir, pids if any(pids) else recorded)
+
+
+# Run in order; each step consumes its context entry, so repeated calls
+# (main's finally, atexit, signal handlers) do no extra work.
+_CLEANUP_STEPS = (_quit_driver, _kill_profile_processes)
+
+
+def _cleanup():
+    for step in _CLEANUP_STEPS:
+        try:
+            step()
+        except Exception:
+            pass
+
+
+@functools.lru_cache(maxsize=8)
+def site_host(site_url: str) -> str:
+    """Host part of site_url ('' if it has none); parsed once per URL."""
+    try:
+        return urlparse(site_url).netloc
+    except Exception:
+        return ''
+
+
+def get_user_data_dir_for_site(site_url: str, suffix: str = ''):
+    """Persistent profile directory for a site: .chrome-profiles/<host><suffix> (created if missing)."""
+    host = site_host(site_url) or 'default'
+    path = os.path.join(_PROFILE_ROOT, _HOST_SAFE_RE.sub("_", host) + suffix)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+@contextlib.contextmanager
+def browser_session(headless=False, user_data_dir=None, lite=False, attach_port=None):
+    """Yield a driver for the profile, cleaning it up on exit.
+
+    With attach_port the browser is never closed; cleanup only detaches from it.
+    """
+    _cleanup()
+    # Install cleanup hooks early with profile information
+    _CLEANUP_CTX.user_data_dir = user_data_dir
+    _CLEANUP_CTX.attached = bool(attach_port)
+    _install_cleanup_handlers()
+    if not attach_port:
+        # 上次运行被强杀时残留的浏览器仍占用该会话目录：按记录的 pid 结束
+        stale = _pop_pid_file(user_data_dir)
+        if stale:
+            _kill_chrome_for_profile(user_data_dir, stale)
+    driver = setup_driver(headless=headless, user_data_dir=user_data_dir, lite=lite, attach_port=attach_port)
+    # Make driver available to cleanup hooks
+    _CLEANUP_CTX.driver = driver
+    _CLEANUP_CTX.browser_pid = getattr(driver, 'browser_pid', None)
+    try:
+        _CLEANUP_CTX.service_pid = driver.service.process.pid
+    except Exception:
+        _CLEANUP_CTX.service_pid = None
+    if not attach_port and user_data_dir:
+        _write_pid_file(user_data_dir, (_CLEANUP_CTX.browser_pid, _CLEANUP_CTX.service_pid))
+    try:
+        yield driver
     finally:
-        # Ensure Chrome for this profile is not left hanging
-        _kill_chrome_for_profile(user_data_dir)
+        _cleanup()
 
 
 def _install_cleanup_handlers():
-    if _CLEANUP_CTX.get('handlers_installed'):
+    if _CLEANUP_CTX.handlers_installed:
         return
-    _CLEANUP_CTX['handlers_installed'] = True
+    _CLEANUP_CTX.handlers_installed = True
 
     # Run on normal interpreter exit
     atexit.register(_cleanup)
@@ -465,7 +1303,7 @@ def _install_cleanup_handlers():
                 # Some environments disallow setting handlers; ignore
                 pass
 
-    if os.name == 'nt' and _CLEANUP_CTX.get('win_ctrl_handler') is None:
+    if os.name == 'nt' and _CLEANUP_CTX.win_ctrl_handler is None:
         try:
             import ctypes
 
@@ -482,197 +1320,320 @@ def _install_cleanup_handlers():
 
             handler = HandlerFunc(console_handler)
             if ctypes.windll.kernel32.SetConsoleCtrlHandler(handler, True):
-                _CLEANUP_CTX['win_ctrl_handler'] = handler
+                _CLEANUP_CTX.win_ctrl_handler = handler
         except Exception:
             pass
 
 
+_CF_RE = re.compile(r"just a moment|checking your browser|cloudflare|请稍候", re.I)
+# 只取标题与正文前 512 字符（验证页文案都在开头），避免每次轮询都把整页 page_source 传回来
+_CF_PROBE_JS = "return document.title + '\\n' + ((document.body && document.body.innerText) || '').slice(0, 512);"
+
+
 def wait_for_cloudflare(driver, headless=False, max_wait=30):
-    # 无头模式下适当等待 Cloudflare 页面
+    # 无头模式下适当等待 Cloudflare 页面；轮询间隔从 0.5s 指数增长到 3s，放行快的页面可立即返回
     if not headless:
         return
     try:
-        for _ in range(max_wait // 3):
-            src = driver.page_source.lower()
-            if all(k not in src for k in ["cloudflare", "just a moment", "checking your browser"]):
+        deadline = time.time() + max_wait
+        interval = 0.5
+        while time.time() < deadline:
+            probe = driver.execute_script(_CF_PROBE_JS) or ''
+            if not _CF_RE.search(probe):
                 return
-            time.sleep(3)
+            time.sleep(min(interval, max(0.0, deadline - time.time())))
+            interval = min(interval * 2, 3.0)
     except Exception:
         pass
 
 
-def get_random_topic(driver, base_url):
-    from selenium.webdriver.common.by import By
-    from selenium.webdriver.support.ui import WebDriverWait
-    from selenium.webdriver.support import expected_conditions as EC
+# 主题 id 紧跟在 /t/ 或 /t/<slug>/ 之后；slug 至少含一个非数字字符，
+# 这样 /t/12345/6 中的楼层号不会被当成 id
+_TOPIC_ID_RE = re.compile(r"/t/(?:[^/?#]*[^\d/?#][^/?#]*/)?(\d+)")
+
+
+def topic_key(url: str) -> str:
+    """同一主题的不同楼层链接（/t/slug/123/45）归为同一个键"""
+    m = _TOPIC_ID_RE.search(url or '')
+    return m.group(1) if m else (url or '').split('?')[0].split('#')[0]
+
+
+# 更精确的选择器，避免匹配到标签链接（合并为一个选择器，一次查询即可）
+TOPIC_LINK_CSS = ", ".join((
+    "a.raw-topic-link",
+    "a.title",
+    ".topic-list-item .main-link a",
+    "tr.topic-list-item .main-link a",
+    "a[href*='/t/']",
+))
+# 只接受真实主题链接（例如 /t/slug/12345），排除标签、用户、分类等页面
+# （"/tag" 已覆盖 "/tags"；只在页面内的 JS 中构造 RegExp 使用，Python 侧无需编译）
+_BLOCKED_TOPIC_PATTERN = r"/tag|/u/|/users/|/c/"
+
+# 一次往返在页面内收集候选主题链接，返回去重后的 [href, title] 列表
+_TOPIC_LINKS_JS = """
+const sel = arguments[0];
+const base = arguments[1];
+const blocked = new RegExp(arguments[2]);
+const seen = new Set();
+const out = [];
+for (const a of document.querySelectorAll(sel)) {
+    const h = a.href;
+    if (!h || !h.startsWith(base) || !h.includes('/t/') || seen.has(h)) continue;
+    if (blocked.test(h)) continue;
+    seen.add(h);
+    out.push([h, (a.innerText || a.textContent || '').trim().slice(0, 80)]);
+}
+return out;
+"""
 
-    def is_topic_url(url: str) -> bool:
-        if not url:
-            return False
-        if not url.startswith(base_url):
-            return False
-        # 只接受真实主题链接，例如 /t/slug/12345
-        if "/t/" not in url:
-            return False
-        # 排除标签、用户、分类等页面
-        blocked = ["/tag", "/tags", "/u/", "/users/", "/c/"]
-        return not any(b in url for b in blocked)
-
-    # 更精确的选择器，避免匹配到标签链接
-    selectors = [
-        "a.raw-topic-link",
-        "a.title",
-        ".topic-list-item .main-link a",
-        "tr.topic-list-item .main-link a",
-        "a[href*='/t/']",
-    ]
 
-    topics = []
+# 轻推滚动以唤醒懒加载：脚本体固定、步长作参数传入，各处复用同一段已编译脚本
+_NUDGE_SCROLL_JS = "window.scrollBy(0, arguments[0]);"
+
+# 就绪等待的轮询间隔：WebDriverWait 默认 0.5 秒，元素出现后平均要多等 250ms
+_READY_POLL_S = 0.1
+
+
+def collect_topics(driver, base_url, visited=None):
+    """Return [(href, title)] for every unvisited topic linked from the current list page."""
     # First wait briefly for any topic link to appear
     try:
-        WebDriverWait(driver, 8).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, ", ".join(selectors)))
+        WebDriverWait(driver, 8, poll_frequency=_READY_POLL_S).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, TOPIC_LINK_CSS))
         )
     except Exception:
         pass
     for _ in range(3):
-        for css in selectors:
-            try:
-                els = driver.find_elements(By.CSS_SELECTOR, css)
-                topics.extend(els)
-            except Exception:
-                continue
-        # 过滤成候选项
-        candidates = []
-        for el in topics:
-            try:
-                href = el.get_attribute('href')
-                if is_topic_url(href):
-                    candidates.append(el)
-            except Exception:
-                continue
+        try:
+            links = driver.execute_script(_TOPIC_LINKS_JS, TOPIC_LINK_CSS, base_url, _BLOCKED_TOPIC_PATTERN) or []
+        except Exception:
+            links = []
+        # 同一主题只保留一个链接，并跳过本次运行已浏览过的主题
+        candidates = {}
+        for h, t in links:
+            key = topic_key(h)
+            if key not in candidates and not (visited and key in visited):
+                candidates[key] = (h, t)
         if candidates:
-            return random.choice(candidates)
-        topics.clear()
+            return list(candidates.values())
         # Nudge scroll to trigger lazy rendering
         try:
-            driver.execute_script("window.scrollBy(0, 400);")
+            driver.execute_script(_NUDGE_SCROLL_JS, 400)
         except Exception:
             pass
-        time.sleep(2)
-    return None
+        wait_for_dynamic_loading(driver, timeout=2)
+    return []
+
+
+# 在页面内（同源，自动带上登录 Cookie）请求 Discourse 的 /latest.json，回传 [id, slug, title]；
+# 失败或被拒时回调 null，由调用方回退到解析列表页
+_LATEST_JSON_JS = """
+const done = arguments[arguments.length - 1];
+fetch(arguments[0], {credentials: 'same-origin', headers: {'Accept': 'application/json'}})
+    .then((r) => (r.ok ? r.json() : null))
+    .then((j) => done(j && j.topic_list
+        ? j.topic_list.topics.map((t) => [t.id, t.slug || '-', t.title || ''])
+        : null))
+    .catch(() => done(null));
+"""
 
 
-def like_visible_posts(driver, rate_config=None, max_per_pass: int = 1):
-    from selenium.webdriver.common.by import By
-    from selenium.webdriver.support.ui import WebDriverWait
-    from selenium.webdriver.support import expected_conditions as EC
+def fetch_latest_topics(driver, base_url, visited=None):
+    """Return [(href, title)] for unvisited topics from /latest.json, or None if unavailable.
 
-    # Clamp max_per_pass to a sane small integer
+    Needs the browser to be on base_url's origin already (any page of the site).
+    """
+    base = base_url.rstrip('/')
     try:
-        max_per_pass = max(1, int(float(max_per_pass)))
+        topics = driver.execute_async_script(_LATEST_JSON_JS, base + '/latest.json')
     except Exception:
-        max_per_pass = 1
+        return None
+    if topics is None:
+        return None
+    return [
+        (f"{base}/t/{slug}/{tid}", title)
+        for tid, slug, title in topics
+        if not (visited and str(tid) in visited)
+    ]
 
-    liked = 0
 
-    # Prefer robust Discourse selectors; fall back to title/aria-label in multiple languages
-    selectors = [
-        ".post-controls button[data-action='like']",
-        "button.toggle-like",
-        ".actions button.like",
-        "button[aria-label*='Like'], button[aria-label*='赞'], button[title*='Like'], button[title*='赞']",
-    ]
+# 计算点击坐标：仅在按钮被遮挡/不在视口内时才滚动居中，
+# 并确认该坐标处命中的正是按钮本身（避免点到吸顶标题栏等浮层）
+_CLICK_POINT_JS = """
+const el = arguments[0];
+const vh = window.innerHeight || document.documentElement.clientHeight || 0;
+let r = el.getBoundingClientRect();
+if (r.top < 80 || r.bottom > vh) {
+    el.scrollIntoView({block: 'center'});
+    r = el.getBoundingClientRect();
+}
+const x = r.left + r.width / 2;
+const y = r.top + r.height / 2;
+const hit = document.elementFromPoint(x, y);
+return (hit && (hit === el || el.contains(hit))) ? [x, y] : null;
+"""
 
-    # Collect candidate buttons from all selectors
-    candidates = []
-    seen_positions = set()
-    viewport_h = 0
+
+def click_element(driver, el) -> bool:
+    """Click via CDP mouse events at the element center.
+
+    One ``Input.dispatchMouseEvent`` pair replaces Selenium's multi-command
+    click path and produces trusted mouse events. Falls back to a JS click
+    when CDP is unavailable or the point is covered by another element.
+    """
+    try:
+        point = driver.execute_script(_CLICK_POINT_JS, el)
+        if point:
+            x, y = point
+            for event_type in ('mousePressed', 'mouseReleased'):
+                driver.execute_cdp_cmd('Input.dispatchMouseEvent', {
+                    'type': event_type,
+                    'x': x,
+                    'y': y,
+                    'button': 'left',
+                    'clickCount': 1,
+                })
+            return True
+    except Exception:
+        pass
     try:
-        viewport_h = int(driver.execute_script("return window.innerHeight || document.documentElement.clientHeight || 0;") or 0)
+        driver.execute_script("arguments[0].click();", el)
+        return True
     except Exception:
-        viewport_h = 0
+        return False
 
-    for css in selectors:
-        try:
-            buttons = driver.find_elements(By.CSS_SELECTOR, css)
-        except Exception:
-            buttons = []
-        for btn in buttons:
-            try:
-                tag = (btn.tag_name or '').lower()
-                if tag != 'button':
-                    continue
-                # De-duplicate by approximate page position
-                loc = btn.location or {}
-                key = (int(loc.get('x', 0)), int(loc.get('y', 0)))
-                if key in seen_positions:
-                    continue
-                seen_positions.add(key)
 
-                aria = (btn.get_attribute('aria-pressed') or '').lower()
-                cls = (btn.get_attribute('class') or '').lower()
-                if 'liked' in cls or 'has-like' in cls or aria == 'true':
-                    continue
+# Prefer robust Discourse selectors; fall back to title/aria-label in multiple languages.
+# Joined into one selector list with the liked states excluded, so the page walks the DOM
+# once and already-liked buttons never reach the script's own checks.
+_LIKE_NOT_LIKED = ":not(.liked):not(.has-like):not([aria-pressed='true'])"
+LIKE_BUTTON_CSS = ", ".join(css + _LIKE_NOT_LIKED for css in (
+    ".post-controls button[data-action='like']",
+    "button.toggle-like",
+    ".actions button.like",
+    "button[aria-label*='Like']",
+    "button[aria-label*='赞']",
+    "button[title*='Like']",
+    "button[title*='赞']",
+))
+
+# 一次 execute_script 完成查找、去重、过滤（已赞/已点过/不在视口）与排序，
+# 返回距视口中心最近的至多 limit 个 [按钮, 帖子id]，Python 只接触真正要点击的元素
+# 已赞判定（class 含 liked/has-like 或 aria-pressed=true），正则在脚本编译时只构造一次
+_IS_LIKED_FN = """
+const STAR_AUTO_LIKED_RE = /liked|has-like/i;
+function starAutoIsLiked(b) {
+    return STAR_AUTO_LIKED_RE.test(b.getAttribute('class') || '')
+        || (b.getAttribute('aria-pressed') || '').toLowerCase() === 'true';
+}
+"""
+_LIKE_TARGETS_FN = _IS_LIKED_FN + """
+function starAutoLikeTargets(selector, limit, skipIds) {
+    const skip = new Set(skipIds || []);
+    const vh = window.innerHeight || document.documentElement.clientHeight || 0;
+    const seen = new Set();
+    const out = [];
+    for (const b of document.querySelectorAll(selector)) {
+        // querySelectorAll already yields each button once; keep at most one per post
+        // (a second click inside the same post could undo the like)
+        const post = b.closest('article[id], [data-post-id]');
+        const owner = post || b;
+        if (seen.has(owner)) continue;
+        if (starAutoIsLiked(b)) {
+            seen.add(owner);
+            continue;
+        }
+        const r = b.getBoundingClientRect();
+        if (vh && (r.bottom <= 0 || r.top >= vh)) continue;
+        // Same check element_to_be_clickable made: rendered and enabled
+        if (b.disabled || !r.width || !r.height) continue;
+        const postId = post ? (post.id || post.getAttribute('data-post-id') || '') : '';
+        if (postId && skip.has(postId)) continue;
+        seen.add(owner);
+        out.push([vh ? Math.abs(r.top + r.height / 2 - vh / 2) : 1e9, b, postId]);
+    }
+    out.sort((a, b) => a[0] - b[0]);
+    return out.slice(0, limit).map(x => [x[1], x[2]]);
+}
+"""
+_LIKE_TARGETS_JS = _LIKE_TARGETS_FN + "return starAutoLikeTargets(arguments[0], arguments[1], arguments[2]);"
+# 点击后在页面内等待按钮变为已赞状态：监听其 class/aria-pressed 变化，超时回调 false
+_LIKE_CONFIRM_JS = _IS_LIKED_FN + """
+const b = arguments[0];
+const timeoutMs = arguments[1];
+const done = arguments[arguments.length - 1];
+const isLiked = () => starAutoIsLiked(b);
+if (isLiked()) return done(true);
+const obs = new MutationObserver(() => {
+    if (isLiked()) {
+        obs.disconnect();
+        done(true);
+    }
+});
+obs.observe(b, {attributes: true, attributeFilter: ['class', 'aria-pressed']});
+setTimeout(() => { obs.disconnect(); done(isLiked()); }, timeoutMs);
+"""
+# 未设置点赞间隔（like_delay_max=0）时，本屏的点赞在页面内依次完成：每次点击后等待状态变化，
+# 再随机停顿 150-250ms。回调 [确认成功数, 已点击的帖子id]；传入 ids 时每点一次立即追加到其中
+_LIKE_BURST_FN = _LIKE_TARGETS_FN + """
+async function starAutoLikeBurst(selector, limit, skipIds, ids = []) {
+    const targets = starAutoLikeTargets(selector, limit, skipIds);
+    const isLiked = starAutoIsLiked;
+    const sleep = (ms) => new Promise((r) => setTimeout(r, ms));
+    let liked = 0;
+    for (const [b, postId] of targets) {
+        b.click();
+        if (postId) ids.push(postId);
+        for (let k = 0; k < 10 && !isLiked(b); k++) await sleep(100);
+        if (isLiked(b)) liked++;
+        await sleep(150 + Math.random() * 100);
+    }
+    return [liked, ids];
+}
+"""
+_LIKE_BURST_JS = _LIKE_BURST_FN + """
+const done = arguments[arguments.length - 1];
+starAutoLikeBurst(arguments[0], arguments[1], arguments[2]).then(done, () => done([0, []]));
+"""
 
-                # Check if the button is in viewport and compute distance to center
-                try:
-                    rect = driver.execute_script(
-                        "const r = arguments[0].getBoundingClientRect(); return [r.top, r.bottom, r.height];",
-                        btn,
-                    ) or [None, None, None]
-                except Exception:
-                    rect = [None, None, None]
-                top, bottom, height = rect
-                if top is None or bottom is None:
-                    continue
-                if viewport_h:
-                    if bottom <= 0 or top >= viewport_h:
-                        # Not visible this pass
-                        continue
-                    center = top + (height or 0) / 2.0
-                    dist_to_center = abs(center - viewport_h / 2.0)
-                else:
-                    # Fallback when viewport size unknown: keep order
-                    dist_to_center = 1e9
 
-                candidates.append((dist_to_center, btn))
-            except Exception:
-                continue
+def like_visible_posts(driver, rate_config=None, max_per_pass: int = 1, clicked=None):
+    """Like up to max_per_pass visible posts; returns the number of confirmed likes.
+
+    ``clicked`` is an optional set of post ids already clicked on this topic.
+    Those posts are skipped, so a like that has not shown up in the DOM yet
+    is not clicked again (which would undo it).
+    """
+    # 调用方传入的已是整数（likes_per_scroll 在配置校验时已转为 int），这里只需保证至少为 1
+    max_per_pass = max(1, max_per_pass)
 
-    # Sort so that we like the element closest to center first
-    candidates.sort(key=lambda x: x[0])
+    liked = 0
+
+    try:
+        candidates = driver.execute_script(
+            _LIKE_TARGETS_JS, LIKE_BUTTON_CSS, max_per_pass, list(clicked or ())
+        ) or []
+    except Exception:
+        candidates = []
 
     # Act on up to max_per_pass candidates
-    for _, btn in candidates:
+    for btn, post_id in candidates:
         if liked >= max_per_pass:
             break
+        if clicked is not None and post_id and post_id in clicked:
+            continue
         try:
+            if not click_element(driver, btn):
+                continue
+            if clicked is not None and post_id:
+                clicked.add(post_id)
+
+            # Confirm state change (waited for inside the page, one round trip)
             try:
-                driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", btn)
-            except Exception:
-                pass
-            try:
-                WebDriverWait(driver, 3).until(EC.element_to_be_clickable(btn))
-            except Exception:
-                pass
-            try:
-                driver.execute_script("arguments[0].click();", btn)
+                ok = driver.execute_async_script(_LIKE_CONFIRM_JS, btn, 1000)
             except Exception:
-                try:
-                    btn.click()
-                except Exception:
-                    continue
-
-            # Confirm state change
-            ok = False
-            for _ in range(5):
-                time.sleep(0.2)
-                aria2 = (btn.get_attribute('aria-pressed') or '').lower()
-                cls2 = (btn.get_attribute('class') or '').lower()
-                if 'liked' in cls2 or 'has-like' in cls2 or aria2 == 'true':
-                    ok = True
-                    break
+                ok = False
             if ok:
                 liked += 1
                 apply_delay(rate_config, 'like')
@@ -681,6 +1642,296 @@ def like_visible_posts(driver, rate_config=None, max_per_pass: int = 1):
     return liked
 
 
+def like_visible_posts_burst(driver, max_per_pass: int = 1, clicked=None):
+    """Like up to max_per_pass visible posts in a single async script; returns confirmed likes.
+
+    Only used when like pacing is disabled, since the clicks are spaced by the
+    page's short built-in jitter rather than like_delay_min/max.
+    """
+    try:
+        liked, ids = driver.execute_async_script(
+            _LIKE_BURST_JS, LIKE_BUTTON_CSS, max_per_pass, list(clicked or ())
+        )
+    except Exception:
+        return 0
+    if clicked is not None:
+        clicked.update(ids)
+    return liked
+
+
+# 页面内安装一次 MutationObserver/ResizeObserver，把最近一次 DOM 变化时间写入
+# window.__lastMutationTs；Python 侧只需读取这一个变量即可判断加载是否稳定。
+# 观察 body 而不是 .post-stream：Discourse 站内跳转会替换帖子流节点。
+_DOM_OBSERVER_JS = """
+(function () {
+    if (window.__starAutoObserver) return;
+    // 帖子流末尾元素进入视口的时间（不可见为 0）；末尾元素随懒加载变化，按帧重新绑定
+    let tail = null;
+    let io = null;
+    let queued = false;
+    const watchTail = () => {
+        queued = false;
+        const el = document.querySelector('.post-stream > :last-child');
+        if (!el || el === tail) return;
+        tail = el;
+        window.__tailSeenAt = 0;
+        if (!io) {
+            io = new IntersectionObserver((entries) => {
+                entries.forEach((e) => { window.__tailSeenAt = e.isIntersecting ? Date.now() : 0; });
+            });
+        }
+        io.disconnect();
+        io.observe(el);
+    };
+    const touch = () => {
+        window.__lastMutationTs = Date.now();
+        if (!queued && window.IntersectionObserver) {
+            queued = true;
+            requestAnimationFrame(watchTail);
+        }
+    };
+    touch();
+    const start = () => {
+        if (window.__starAutoObserver) return;
+        window.__starAutoObserver = new MutationObserver(touch);
+        window.__starAutoObserver.observe(document.body, {
+            childList: true,
+            subtree: true,
+            attributes: true,
+            attributeFilter: ['id', 'class', 'src', 'data-post-number'],
+        });
+        if (window.ResizeObserver) {
+            new ResizeObserver(touch).observe(document.body);
+        }
+    };
+    if (document.body) {
+        start();
+    } else {
+        document.addEventListener('DOMContentLoaded', start, {once: true});
+    }
+})();
+"""
+
+
+def install_dom_observer(driver):
+    try:
+        driver.execute_script(_DOM_OBSERVER_JS)
+    except Exception:
+        pass
+
+
+# 一次往返取回滚动位置、视口高度、页面总高度、距上次 DOM 变化的毫秒数（未安装观察器时为 -1）、
+# 帖子流中最后一个已渲染帖子的楼层号，以及末尾元素已持续可见的毫秒数（不可见为 -1）
+_SCROLL_METRICS_FN = """
+function starAutoMetrics() {
+    const doc = document.documentElement;
+    const body = document.body;
+    const scrollY = window.scrollY || window.pageYOffset || doc.scrollTop || body.scrollTop || 0;
+    const innerH = window.innerHeight || doc.clientHeight || 0;
+    const scrollH = Math.max(body.scrollHeight, doc.scrollHeight);
+    const quiet = window.__lastMutationTs ? Date.now() - window.__lastMutationTs : -1;
+    const posts = document.querySelectorAll('.post-stream [data-post-number]');
+    const lastPost = posts.length ? posts[posts.length - 1].getAttribute('data-post-number') : null;
+    const tail = window.__tailSeenAt ? Date.now() - window.__tailSeenAt : -1;
+    return [scrollY, innerH, scrollH, quiet, lastPost, tail];
+}
+"""
+# 一次往返完成“测量 → 决定步长 → 滚动 → 再测量”：回传 [滚动前指标, 滚动后指标]。
+# 已在底部时不滚动，滚动后指标为 null。步长：距底部超过 800px 时 600px，否则 200px。
+# 滚动在下一帧执行、再下一帧测量；窗口被遮挡/最小化时 rAF 会暂停，因此用定时器兜底。
+_SCROLL_ADVANCE_JS = _SCROLL_METRICS_FN + """
+const done = arguments[arguments.length - 1];
+const before = starAutoMetrics();
+const remaining = before[2] - (before[0] + before[1]);
+if (remaining <= 2) return done([before, null]);
+const step = remaining > 800 ? 600 : 200;
+let scrolled = false;
+let finished = false;
+const scroll = () => {
+    if (scrolled) return;
+    scrolled = true;
+    window.scrollBy(0, step);
+};
+const finish = () => {
+    if (finished) return;
+    finished = true;
+    done([before, starAutoMetrics()]);
+};
+requestAnimationFrame(() => { scroll(); requestAnimationFrame(finish); });
+setTimeout(() => { scroll(); setTimeout(finish, 50); }, 250);
+"""
+_DOM_QUIET_MS = 1500
+
+
+def scroll_advance(driver):
+    """Measure, scroll one step unless already at the bottom, and measure again, in one round trip.
+
+    Returns (before, after): each is [scroll_y, inner_h, scroll_h, quiet_ms,
+    last_post_number, tail_ms]; after is None when nothing was scrolled.
+    """
+    before, after = driver.execute_async_script(_SCROLL_ADVANCE_JS)
+    return before, after
+
+
+# 帖子流中已渲染的帖子数（用于判断是否追加了新帖）
+_POST_COUNT_FN = """
+function starAutoPostCount() {
+    return document.querySelectorAll('.post-stream [data-post-number]').length;
+}
+"""
+
+# 在页面内等待：每次只睡到“最近一次变化 + quietMs”再复查，静默或超时即回调页面总高度
+# （超时回调 null）。untilNewPost 时帖子流一追加新帖就提前回调，复查间隔按 100→800ms 退避。
+# 观察器缺失时先就地安装，保证有时间戳可用。
+_DOM_QUIET_WAIT_JS = _DOM_OBSERVER_JS + _POST_COUNT_FN + """
+const quietMs = arguments[0];
+const timeoutMs = arguments[1];
+const untilNewPost = arguments[2];
+const done = arguments[arguments.length - 1];
+const t0 = Date.now();
+const posts0 = untilNewPost ? starAutoPostCount() : 0;
+let backoff = 100;
+const height = () => Math.max(document.body.scrollHeight, document.documentElement.scrollHeight);
+(function check() {
+    const now = Date.now();
+    const idle = now - (window.__lastMutationTs || 0);
+    if (idle >= quietMs) return done(height());
+    if (untilNewPost && starAutoPostCount() > posts0) return done(height());
+    if (now - t0 >= timeoutMs) return done(null);
+    let wait = Math.min(quietMs - idle, timeoutMs - (now - t0));
+    if (untilNewPost) {
+        wait = Math.min(wait, backoff);
+        backoff = Math.min(backoff * 2, 800);
+    }
+    setTimeout(check, wait + 10);
+})();
+"""
+
+
+def wait_for_dynamic_loading(driver, timeout=5, quiet_ms=800, until_new_post=False):
+    """Wait until the DOM has been quiet for quiet_ms, bounded by timeout seconds.
+
+    Event-driven via the in-page observer and resolved by a single
+    execute_async_script call. Returns the page scrollHeight once settled,
+    or None on timeout. With until_new_post it also returns as soon as the
+    post stream grows, so lazy-loaded posts are scrolled to without waiting
+    for the whole batch to settle.
+    """
+    try:
+        return driver.execute_async_script(_DOM_QUIET_WAIT_JS, quiet_ms, int(timeout * 1000), until_new_post)
+    except Exception:
+        return None
+
+
+# 不点赞（或点赞不设间隔）时整段阅读在页面内完成：按配置的滚动间隔逐步下滑，每步前可先
+# 批量点赞本屏，到底后等待懒加载静默（追加了新帖则立即继续），末尾帖子持续可见或连续两次仍在底部即结束。
+# 判定规则与 scroll_and_read 一致。阅读分片进行：进度（步数、到底计数、已点击的帖子等）保存在
+# window.__starAutoRead，每次调用运行约 sliceMs 后回调 [是否结束, 累计点赞数, 待停顿毫秒]，
+# 由 Python 停顿后再发起下一片，单次调用远低于 selenium 固定的 120 秒 HTTP 超时。
+_READ_THROUGH_JS = _DOM_OBSERVER_JS + _SCROLL_METRICS_FN + _POST_COUNT_FN + _LIKE_BURST_FN + """
+const [maxScrolls, delayMin, delayMax, quietMs, likeSel, likeLimit, sliceMs, reset] = arguments;
+const done = arguments[arguments.length - 1];
+const sleep = (ms) => new Promise((r) => setTimeout(r, ms));
+if (reset || !window.__starAutoRead) {
+    window.__starAutoRead = {clicked: [], liked: 0, steps: 0, stableBottom: 0, lastH: null};
+}
+const st = window.__starAutoRead;
+st.cancelled = false;
+st.running = true;
+const t0 = Date.now();
+(async () => {
+    while (st.steps < maxScrolls && !st.cancelled) {
+        st.steps++;
+        if (likeSel) {
+            const [n] = await starAutoLikeBurst(likeSel, likeLimit, st.clicked, st.clicked);
+            st.liked += n;
+        }
+        const [y, innerH, h, quiet, , tail] = starAutoMetrics();
+        if (st.lastH !== null && h > st.lastH) st.stableBottom = 0;
+        st.lastH = h;
+        if (y + innerH >= h - 2) {
+            st.stableBottom++;
+            if ((tail >= quietMs && quiet >= quietMs) || st.stableBottom >= 2) break;
+            const w0 = Date.now();
+            const posts0 = starAutoPostCount();
+            let backoff = 100;
+            let idle = Date.now() - (window.__lastMutationTs || 0);
+            while (idle < quietMs && Date.now() - w0 < 10000 && starAutoPostCount() <= posts0) {
+                await sleep(Math.max(50, Math.min(quietMs - idle, backoff)));
+                backoff = Math.min(backoff * 2, 800);
+                idle = Date.now() - (window.__lastMutationTs || 0);
+            }
+            // 末尾帖子仍在视口内，且等到静默也没有追加新帖：已读到结尾，不再多确认一轮
+            if (window.__tailSeenAt && idle >= quietMs && starAutoPostCount() <= posts0) break;
+            continue;
+        }
+        window.scrollBy(0, h - (y + innerH) > 800 ? 600 : 200);
+        const pause = delayMin + Math.random() * (delayMax - delayMin);
+        // 本片时间用尽：把这次停顿交给 Python，下一片从当前位置继续
+        if (Date.now() - t0 + pause >= sliceMs && st.steps < maxScrolls) return [false, st.liked, pause];
+        await sleep(pause);
+    }
+    return [true, st.liked, 0];
+})().then(done, () => done([true, st.liked, 0])).finally(() => { st.running = false; });
+"""
+# 让页面内仍在运行的阅读循环在下一次检查时退出，等它真正停下（最多 20 秒）后回调
+# [是否已停止, 累计点赞数, 已点击的帖子id]；页面已跳转（没有进度）时视为已停止
+_READ_THROUGH_STOP_JS = """
+const done = arguments[arguments.length - 1];
+const st = window.__starAutoRead;
+if (!st) return done([true, 0, []]);
+st.cancelled = true;
+const t0 = Date.now();
+(function check() {
+    if (!st.running || Date.now() - t0 > 20000) return done([!st.running, st.liked, st.clicked]);
+    setTimeout(check, 100);
+})();
+"""
+# 每片的时间预算；加上最后一步（本屏点赞 + 到底最多 10 秒的等待）仍远低于 120 秒
+_READ_SLICE_MS = 40000
+
+
+def read_through_in_page(driver, max_scrolls=200, rate_config=None, like_limit=0, clicked=None):
+    """Scroll a topic to its end inside the page; returns (finished, likes made).
+
+    like_limit > 0 likes up to that many visible posts before every step
+    (only for unpaced likes, see like_visible_posts_burst); 0 just reads.
+    The read runs in slices of about _READ_SLICE_MS, each resuming where the
+    last one stopped, so no call comes near selenium's fixed 120 s HTTP read
+    timeout. If a slice fails, the in-page loop is stopped and the post ids it
+    clicked are added to ``clicked``. finished is then False and the caller may
+    continue in Python. finished stays True if the loop could not be confirmed
+    stopped, so nothing scrolls or likes alongside it.
+    """
+    # rate_config 已由 normalize_rate_config 校验（min <= max，均非负）
+    delay_min = rate_config['scroll_delay_min'] if rate_config else 0.0
+    delay_max = rate_config['scroll_delay_max'] if rate_config else 0.0
+    args = (
+        max_scrolls, int(delay_min * 1000), int(delay_max * 1000), _DOM_QUIET_MS,
+        LIKE_BUTTON_CSS if like_limit else None, like_limit, _READ_SLICE_MS,
+    )
+    # 一片的预算，加上最后一步的本屏点赞与到底等待，另留余量
+    driver.set_script_timeout(_READ_SLICE_MS / 1000 + 40)
+    reset = True
+    try:
+        while True:
+            finished, liked, pause_ms = driver.execute_async_script(_READ_THROUGH_JS, *args, reset)
+            reset = False
+            if finished:
+                return True, liked
+            time.sleep(pause_ms / 1000)
+    except Exception:
+        try:
+            stopped, liked, ids = driver.execute_async_script(_READ_THROUGH_STOP_JS)
+        except Exception:
+            return True, 0
+        if clicked is not None:
+            clicked.update(ids)
+        return not stopped, liked
+    finally:
+        driver.set_script_timeout(30)
+
+
 def scroll_and_read(driver, enable_like=False, max_scrolls=200, rate_config=None):
     """Scroll through the page and optionally like visible posts.
 
@@ -695,77 +1946,174 @@ def scroll_and_read(driver, enable_like=False, max_scrolls=200, rate_config=None
     total_liked = 0
     stable_bottom = 0
     last_total_h = None
+    # Post ids clicked on this topic (O(1) membership; reset per call)
+    clicked = set()
+    # Fingerprint of the post stream: last rendered post number and how many probes it held still
+    last_post_no = None
+    post_no_stable = 0
 
     # Determine likes per scroll pass to pace likes with scrolling.
     # 0 means exhaust all visible likes before the next scroll.
-    likes_per_scroll = 0
-    if isinstance(rate_config, dict):
-        try:
-            likes_per_scroll = int(float(rate_config.get('likes_per_scroll', 0)))
-        except Exception:
-            likes_per_scroll = 0
-
-    def get_scroll_metrics():
-        return driver.execute_script(
-            """
-            const doc = document.documentElement;
-            const body = document.body;
-            const scrollY = window.scrollY || window.pageYOffset || doc.scrollTop || body.scrollTop || 0;
-            const innerH = window.innerHeight || doc.clientHeight || 0;
-            const scrollH = Math.max(body.scrollHeight, doc.scrollHeight);
-            return [scrollY, innerH, scrollH];
-            """
+    # rate_config was validated once by normalize_rate_config; None means no pacing at all
+    likes_per_scroll = rate_config['likes_per_scroll'] if rate_config else 0
+
+    # Without a like delay there is no pacing to keep between clicks: batch them in the page
+    burst = enable_like and (not rate_config or rate_config['like_delay_max'] <= 0)
+
+    if burst or not enable_like:
+        # No pacing to keep between clicks (or nothing to click): let the page drive
+        # the whole read, one round trip
+        # 页面内阅读失败且已确认停止时，沿用它点过的帖子与点赞数，在下面逐步继续
+        like_limit = (likes_per_scroll if likes_per_scroll > 0 else 1000) if burst else 0
+        finished, total_liked = read_through_in_page(
+            driver, max_scrolls=max_scrolls, rate_config=rate_config, like_limit=like_limit, clicked=clicked
         )
+        if finished:
+            return total_liked
 
     for i in range(max_scrolls):
         # Perform likes first; it may scroll elements into view
-        if enable_like:
+        if burst:
+            total_liked += like_visible_posts_burst(
+                driver, max_per_pass=likes_per_scroll if likes_per_scroll > 0 else 1000, clicked=clicked
+            )
+        elif enable_like:
             if likes_per_scroll <= 0:
                 # Exhaust mode: like one at a time with delay between each,
                 # until no visible unliked buttons remain in current viewport.
                 while True:
-                    liked_now = like_visible_posts(driver, rate_config=rate_config, max_per_pass=1)
+                    liked_now = like_visible_posts(driver, rate_config=rate_config, max_per_pass=1, clicked=clicked)
                     total_liked += liked_now
                     if liked_now <= 0:
                         break
             else:
-                total_liked += like_visible_posts(driver, rate_config=rate_config, max_per_pass=max(1, likes_per_scroll))
-
-        # Measure after likes to get accurate position
-        y, inner_h, total_h = get_scroll_metrics()
+                total_liked += like_visible_posts(
+                    driver, rate_config=rate_config, max_per_pass=max(1, likes_per_scroll), clicked=clicked
+                )
+
+        # Measure after likes (they may scroll), then step unless already at the bottom: one round trip
+        before, after = scroll_advance(driver)
+        total_h, quiet_ms, post_no, tail_ms = before[2:]
+        if quiet_ms < 0:
+            # Bootstrap was not registered via CDP (or page predates it); inject once
+            install_dom_observer(driver)
+        if post_no is not None and post_no == last_post_no:
+            post_no_stable += 1
+        else:
+            post_no_stable = 0
+        last_post_no = post_no
 
         # If new content increased total height, reset bottom stability
         if last_total_h is not None and total_h > last_total_h:
             stable_bottom = 0
 
-        # Check if we are already at bottom; if so, avoid extra scrollBy
-        if (y + inner_h) >= (total_h - 2):
+        # Already at the bottom: the page did not scroll
+        if after is None:
             stable_bottom += 1
             last_total_h = total_h
+            # Last post has stayed in view and nothing was appended meanwhile: the topic is fully loaded
+            if tail_ms >= _DOM_QUIET_MS and quiet_ms >= _DOM_QUIET_MS:
+                break
+            # No new posts for several probes and the DOM is already quiet: the topic is fully loaded
+            if post_no_stable >= 3 and quiet_ms >= _DOM_QUIET_MS:
+                break
             if stable_bottom >= 2:
                 break
-            # Give time for potential lazy-load to append more content
-            apply_delay(rate_config, 'scroll')
+            # Give lazy-load time to append more content: wait until the DOM goes quiet
+            if quiet_ms < _DOM_QUIET_MS:
+                settled_h = wait_for_dynamic_loading(driver, timeout=10, quiet_ms=_DOM_QUIET_MS, until_new_post=True)
+                # Last post was in view and the page went quiet without growing: nothing more is coming
+                if tail_ms >= 0 and settled_h is not None and settled_h <= total_h:
+                    break
             continue
 
-        # Not yet at bottom; pick step size
-        remaining = max(0, total_h - (y + inner_h))
-        step = 600 if remaining > 800 else 200
-        driver.execute_script(f"window.scrollBy(0, {step});")
-
-        apply_delay(rate_config, 'scroll')
-
-        # Re-measure to update trackers
-        y2, inner_h2, total_h2 = get_scroll_metrics()
+        # Not yet at bottom: the page scrolled one step; update trackers from the new height
+        total_h2 = after[2]
         if total_h2 > total_h:
             stable_bottom = 0
         last_total_h = total_h2
 
+        apply_delay(rate_config, 'scroll')
+
     return total_liked
 
 
+def wait_ready(driver, css, timeout=10):
+    """Wait until an element matching css is present; True if it appeared in time."""
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=_READY_POLL_S).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, css))
+        )
+        return True
+    except Exception:
+        return False
+
+
+# 常见 Discourse 登录后特征（尽量减少误判）
+LOGGED_IN_CSS = (
+    "#current-user",
+    ".header-dropdown-toggle.current-user",
+    "a[data-user-card][href*='/u/']",
+    ".d-header .user-menu .avatar",
+)
+LOGIN_ENTRY_CSS = "a[href*='login'], .login-button, button.login-button"
+
+
+# 在页面内监听登录完成：回到本站且出现用户头像（或登录入口消失）即回调 true，超时回调 false。
+# 站外页面（如统一认证）只等待，跳转会中断脚本，由 Python 侧在新页面上重新挂载。
+_LOGIN_WAIT_JS = """
+const host = arguments[0];
+const loggedInSel = arguments[1];
+const loginSel = arguments[2];
+const timeoutMs = arguments[3];
+const done = arguments[arguments.length - 1];
+const visible = (sel) => Array.from(document.querySelectorAll(sel)).some((el) => el.getClientRects().length > 0);
+const check = () => location.host === host && (visible(loggedInSel) || !visible(loginSel));
+if (check()) return done(true);
+let pending = false;
+const obs = new MutationObserver(() => {
+    if (pending) return;
+    pending = true;
+    setTimeout(() => {
+        pending = false;
+        if (check()) {
+            obs.disconnect();
+            done(true);
+        }
+    }, 100);
+});
+obs.observe(document.documentElement, {childList: true, subtree: true, attributes: true});
+setTimeout(() => { obs.disconnect(); done(false); }, timeoutMs);
+"""
+
+_LOGIN_WAIT_SLICE_S = 60
+
+
+def wait_for_login(driver, base_url, timeout=300):
+    """Block until the user has logged in on base_url's host; False on timeout."""
+    host = site_host(base_url)
+    deadline = time.time() + timeout
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        # 每次最多监听 _LOGIN_WAIT_SLICE_S 秒：远低于 selenium 固定的 120 秒 HTTP 超时，
+        # 不会在上一条脚本仍挂在 chromedriver 中时又发出新的一条
+        wait_s = min(remaining, _LOGIN_WAIT_SLICE_S)
+        try:
+            driver.set_script_timeout(wait_s + 5)
+            if driver.execute_async_script(
+                _LOGIN_WAIT_JS, host, ", ".join(LOGGED_IN_CSS), LOGIN_ENTRY_CSS, int(wait_s * 1000)
+            ):
+                return True
+        except Exception:
+            # 页面跳转（登录流程中很常见）会中断脚本：稍候在新页面上继续监听
+            time.sleep(1)
+        finally:
+            driver.set_script_timeout(30)
+
+
 def ensure_login(driver, base_url, headless=False):
-    from selenium.webdriver.common.by import By
     try:
         def any_visible(selector: str):
             els = driver.find_elements(By.CSS_SELECTOR, selector)
@@ -778,14 +2126,7 @@ def ensure_login(driver, base_url, headless=False):
             return None
 
         def looks_logged_in() -> bool:
-            # 常见 Discourse 登录后特征（尽量减少误判）
-            checks = [
-                "#current-user",
-                ".header-dropdown-toggle.current-user",
-                "a[data-user-card][href*='/u/']",
-                ".d-header .user-menu .avatar",
-            ]
-            for css in checks:
+            for css in LOGGED_IN_CSS:
                 if any_visible(css):
                     return True
             return False
@@ -793,13 +2134,20 @@ def ensure_login(driver, base_url, headless=False):
         driver.get(base_url)
         # 等待 Cloudflare/反爬检查通过后再判断登录态
         wait_for_cloudflare(driver, headless=headless, max_wait=60)
-        time.sleep(2)
+        # Discourse 登录后会下发 _t 会话 Cookie：持久会话目录下的常见情况，无需等待页头渲染
+        try:
+            if driver.get_cookie('_t'):
+                return True
+        except Exception:
+            pass
+        # 页头渲染出用户头像或登录入口即可判断
+        wait_ready(driver, ", ".join(LOGGED_IN_CSS + (LOGIN_ENTRY_CSS,)), timeout=5)
 
         if looks_logged_in():
             return True
 
         # 仅当“可见”的登录入口存在时才判断为未登录
-        if any_visible("a[href*='login'], .login-button, button.login-button"):
+        if any_visible(LOGIN_ENTRY_CSS):
             if headless:
                 print("⚠️ 当前为无头模式且检测到未登录状态。")
                 print("   请先以有头模式运行并登录一次，或复用已有Chrome用户数据目录。")
@@ -808,26 +2156,54 @@ def ensure_login(driver, base_url, headless=False):
             else:
                 print("ℹ️ 检测到未登录状态，请在打开的浏览器中手动登录后返回终端。")
                 print("   登录完成后本脚本会自动继续……(最多等待5分钟)")
-                start = time.time()
-                while time.time() - start < 300:
-                    time.sleep(3)
-                    driver.get(base_url)
-                    wait_for_cloudflare(driver, headless=headless, max_wait=30)
-                    time.sleep(2)
-                    if looks_logged_in() or not any_visible("a[href*='login'], .login-button, button.login-button"):
-                        print("✅ 已检测到登录状态")
-                        return True
+                if wait_for_login(driver, base_url, timeout=300):
+                    print("✅ 已检测到登录状态")
+                    return True
                 print("⚠️ 登录超时，继续尝试未登录流程……")
         return True
     except Exception:
         return True
 
 
-def run_random_mode(driver, base_url, cycles, enable_like, headless, rate_config=None):
-    from selenium.webdriver.common.by import By
-    from selenium.webdriver.support.ui import WebDriverWait
-    from selenium.webdriver.support import expected_conditions as EC
+# 帖子页已渲染出首个帖子即可开始阅读
+TOPIC_READY_CSS = "div.topic-post, article[id^='post_']"
+
 
+def wait_for_topic(driver, timeout=10):
+    """Wait until the topic's first posts are rendered instead of sleeping a fixed time."""
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=_READY_POLL_S).until(
+            EC.presence_of_all_elements_located((By.CSS_SELECTOR, TOPIC_READY_CSS))
+        )
+        return True
+    except Exception:
+        return False
+
+
+def open_topic_page(driver, url, headless):
+    """Load a topic with a full navigation and wait out any Cloudflare check before reading it."""
+    driver.get(url)
+    wait_for_cloudflare(driver, headless=headless)
+
+
+def browse_topic(driver, open_topic, enable_like, rate_config=None):
+    """Open a topic via open_topic(), wait for its posts, read it through and report."""
+    open_topic()
+    wait_for_topic(driver)
+    liked = scroll_and_read(driver, enable_like=enable_like, rate_config=rate_config)
+    if enable_like:
+        print(f"✅ 已浏览并点赞 {liked} 次")
+    else:
+        print("✅ 已浏览（未开启点赞）")
+    return liked
+
+
+VISITED_TOPICS_MAX = 256
+# 每隔多少轮回到列表页刷新候选主题（捕获新帖）
+TOPIC_POOL_REFRESH_CYCLES = 5
+
+
+def run_random_mode(driver, base_url, cycles, enable_like, headless, rate_config=None):
     def open_topics_index():
         candidates = [
             base_url,
@@ -837,24 +2213,23 @@ def run_random_mode(driver, base_url, cycles, enable_like, headless, rate_config
         ]
         for url in candidates:
             try:
-                driver.get(url)
+                # 首页可能已在帖子间停顿期间预加载，避免重复导航
+                if driver.current_url.rstrip('/') != url.rstrip('/'):
+                    driver.get(url)
                 wait_for_cloudflare(driver, headless=headless, max_wait=60)
                 # Wait up to ~10s for any topic list/link to appear
                 try:
-                    WebDriverWait(driver, 10).until(
-                        EC.presence_of_element_located((
-                            By.CSS_SELECTOR,
-                            "a.raw-topic-link, a.title, .topic-list-item .main-link a, tr.topic-list-item .main-link a, a[href*='/t/']"
-                        ))
+                    WebDriverWait(driver, 10, poll_frequency=_READY_POLL_S).until(
+                        EC.presence_of_element_located((By.CSS_SELECTOR, TOPIC_LINK_CSS))
                     )
                     return True
                 except Exception:
                     # small scroll to wake lazy render
                     try:
-                        driver.execute_script("window.scrollBy(0, 600);")
+                        driver.execute_script(_NUDGE_SCROLL_JS, 600)
                     except Exception:
                         pass
-                    time.sleep(1.5)
+                    wait_for_dynamic_loading(driver, timeout=1.5)
                     # One more quick check
                     els = driver.find_elements(By.CSS_SELECTOR, "a[href*='/t/']")
                     if els:
@@ -862,59 +2237,157 @@ def run_random_mode(driver, base_url, cycles, enable_like, headless, rate_config
             except Exception:
                 continue
         return False
-    for idx in range(cycles):
-        print(f"➡️  循环 {idx + 1}/{cycles}")
+
+    def needs_refill(idx):
+        return not pool or idx % TOPIC_POOL_REFRESH_CYCLES == 0
+
+    def refill():
+        nonlocal use_json
+        # 优先用站点自带的 JSON 列表（无需跳转/渲染列表页），不可用时再解析列表页
+        if use_json:
+            topics = fetch_latest_topics(driver, base_url, visited=visited)
+            if topics is not None:
+                return topics
+            use_json = False
         if not open_topics_index():
             print("⚠️ 未找到帖子列表，跳过本次循环")
-            continue
-        topic = get_random_topic(driver, base_url)
-        if not topic:
+            return None
+        return collect_topics(driver, base_url, visited=visited)
+
+    use_json = True
+
+    # 最近浏览过的主题：集合用于 O(1) 判重，队列限定容量并记录淘汰顺序
+    visited = set()
+    visited_order = collections.deque()
+    # 从列表页一次收集的候选主题；用完或每隔若干轮才回到列表页刷新
+    pool = []
+    for idx in range(cycles):
+        print(f"➡️  循环 {idx + 1}/{cycles}")
+        if needs_refill(idx):
+            topics = refill()
+            if topics is None:
+                continue
+            pool = topics
+        if not pool:
             print("⚠️ 未找到帖子，跳过本次循环")
             continue
-        title = (topic.text or '').strip()[:50]
-        print(f"🧭 打开帖子: {title}")
-        try:
-            topic.click()
-        except Exception:
-            href = topic.get_attribute('href')
-            if href:
-                driver.get(href)
-        time.sleep(2)
-        liked = scroll_and_read(driver, enable_like=enable_like, rate_config=rate_config)
-        if enable_like:
-            print(f"✅ 已浏览并点赞 {liked} 次")
-        else:
-            print("✅ 已浏览（未开启点赞）")
+        href, title = pool.pop(random.randrange(len(pool)))
+        print(f"🧭 打开帖子: {title[:50]}")
+        key = topic_key(href)
+        if key not in visited:
+            if len(visited_order) >= VISITED_TOPICS_MAX:
+                visited.discard(visited_order.popleft())
+            visited.add(key)
+            visited_order.append(key)
+        browse_topic(driver, lambda: open_topic_page(driver, href, headless), enable_like, rate_config=rate_config)
         if idx < cycles - 1:
+            if needs_refill(idx + 1) and not use_json:
+                # 非阻塞地发起首页导航，让页面加载与帖子间停顿重叠
+                try:
+                    driver.execute_script("location.assign(arguments[0]);", base_url)
+                except Exception:
+                    pass
             apply_delay(rate_config, 'topic')
 
 
 def run_direct_mode(driver, url, enable_like, headless, rate_config=None):
     print(f"🧭 打开链接: {url}")
-    driver.get(url)
-    wait_for_cloudflare(driver, headless=headless)
-    time.sleep(3)
-    liked = scroll_and_read(driver, enable_like=enable_like, rate_config=rate_config)
-    if enable_like:
-        print(f"✅ 已浏览并点赞 {liked} 次")
-    else:
-        print("✅ 已浏览（未开启点赞）")
+    browse_topic(driver, lambda: open_topic_page(driver, url, headless), enable_like, rate_config=rate_config)
+
+
+def _random_mode_worker(worker_idx, base_url, cycles, enable_like, headless, rate_config, user_data_dir, lite):
+    """Entry point of one --workers process: own Chrome, own profile, its share of the cycles."""
+    _load_selenium()
+    with browser_session(headless=headless, user_data_dir=user_data_dir, lite=lite) as driver:
+        print(f"✅ [worker {worker_idx}] 浏览器已启动: {user_data_dir}")
+        if not ensure_login(driver, base_url, headless=headless):
+            print(f"⏹️ [worker {worker_idx}] 未登录且为无头模式，跳过。")
+            return
+        run_random_mode(driver, base_url, cycles, enable_like, headless, rate_config=rate_config)
+
+
+def run_random_mode_parallel(base_url, cycles, workers, enable_like, headless, rate_config, user_data_dirs, lite=False):
+    """Split cycles across len(user_data_dirs) processes, each driving its own browser."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    shares = [cycles // workers + (1 if i < cycles % workers else 0) for i in range(workers)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(
+                _random_mode_worker, i, base_url, n, enable_like, headless, rate_config, user_data_dirs[i], lite
+            )
+            for i, n in enumerate(shares) if n > 0
+        ]
+        for fut in futures:
+            try:
+                fut.result()
+            except Exception as e:
+                print(f"⚠️ 并行任务失败: {e}")
+
+
+def _prompt(text):
+    """Write text and read one line from stdin (like input(), but '' on EOF instead of raising)."""
+    sys.stdout.write(text)
+    sys.stdout.flush()
+    return sys.stdin.readline().rstrip('\r\n')
+
+
+# 启动时的配置概览；间隔类数值直接从 rate_config 取并在模板里格式化
+_SUMMARY_TEMPLATE = (
+    "\n配置概览:\n"
+    "- 站点: {base_url}\n"
+    "- 模式: {mode}\n"
+    "- {target}\n"
+    "- 无头: {headless}\n"
+    "- 点赞: {like}\n"
+    "- 滚动间隔: {rate[scroll_delay_min]:.2f}-{rate[scroll_delay_max]:.2f}s\n"
+    "- 点赞间隔: {rate[like_delay_min]:.2f}-{rate[like_delay_max]:.2f}s\n"
+    "- 每次滚动最多点赞: {lps}\n"
+    "- 帖子间停顿: {rate[topic_delay_min]:.2f}-{rate[topic_delay_max]:.2f}s\n"
+)
+
+
+def _resolve_tri(on, off, default):
+    """Resolve a --x/--no-x flag pair: whichever was given, else the saved default."""
+    return True if on else False if off else default
+
+
+def _ask(prompt, default=None):
+    """Prompt once; an empty answer keeps default."""
+    sfx = f" (默认: {default})" if default not in [None, ''] else ''
+    val = _prompt(f"{prompt}{sfx}: ").strip()
+    return val if val else default
+
+
+def _ask_yes_no(prompt, default):
+    """y/n prompt; an empty or unrecognised answer keeps default."""
+    ans = _prompt(f"{prompt} (y/n, 默认{'y' if default else 'n'}): ")
+    try:
+        return _as_bool(ans) if ans.strip() else default
+    except ValueError:
+        return default
 
 
 def ensure_dependencies():
     if check_dependencies():
         return True
     print("⚠️ 缺少依赖：selenium / undetected_chromedriver / webdriver_manager")
+    if not sys.stdin.isatty():
+        # 非交互环境（cron/CI）不阻塞等待输入
+        print("请先安装依赖后再运行: pip install -r requirements.txt")
+        return False
     # 在无参数场景下，尽量降低门槛，提供自动安装
-    ans = input("是否自动安装依赖? (Y/n): ").strip().lower()
+    ans = _prompt("是否自动安装依赖? (Y/n): ").strip().lower()
     if ans in ['', 'y', 'yes']:
         try:
+            # 优先使用 wheel、跳过 pip 自身版本检查与下载缓存，缩短首次安装时间
+            pip = [sys.executable, '-m', 'pip', 'install',
+                   '--prefer-binary', '--no-cache-dir', '--disable-pip-version-check']
             # 优先使用 requirements.txt
             if os.path.exists('requirements.txt'):
-                subprocess.check_call([sys.executable, '-m', 'pip', 'install', '-r', 'requirements.txt'])
+                subprocess.check_call(pip + ['-r', 'requirements.txt'])
             else:
-                subprocess.check_call([sys.executable, '-m', 'pip', 'install',
-                                       'selenium', 'undetected-chromedriver', 'webdriver-manager'])
+                subprocess.check_call(pip + ['selenium', 'undetected-chromedriver', 'webdriver-manager'])
             print('✅ 依赖安装完成\n')
             return True
         except Exception as e:
@@ -931,10 +2404,6 @@ def main():
     print("🌐 Discourse 自动化（极简单文件版）")
     print("=" * 60)
 
-    # 依赖检查（支持自动安装）
-    if not ensure_dependencies():
-        return
-
     # 解析参数
     parser = argparse.ArgumentParser(add_help=True)
     parser.add_argument('--configure', action='store_true', help='交互式配置并保存到 settings.json')
@@ -942,54 +2411,36 @@ def main():
     parser.add_argument('--mode', choices=['random', 'direct'], help='运行模式')
     parser.add_argument('--url', help='当 mode=direct 时的帖子链接')
     parser.add_argument('--cycles', type=int, help='随机浏览模式循环次数')
-    parser.add_argument('--headless', action='store_true', help='启用无头模式')
-    parser.add_argument('--no-headless', action='store_true', help='禁用无头模式')
-    parser.add_argument('--like', action='store_true', help='启用点赞')
-    parser.add_argument('--no-like', action='store_true', help='禁用点赞')
+    # 成对的开关互斥：同时给出时由 argparse 报错，而不是各自按不同的优先级处理
+    headless_group = parser.add_mutually_exclusive_group()
+    headless_group.add_argument('--headless', action='store_true', help='启用无头模式')
+    headless_group.add_argument('--no-headless', action='store_true', help='禁用无头模式')
+    like_group = parser.add_mutually_exclusive_group()
+    like_group.add_argument('--like', action='store_true', help='启用点赞')
+    like_group.add_argument('--no-like', action='store_true', help='禁用点赞')
+    parser.add_argument('--lite', action='store_true', help='省流模式：不加载图片与字体')
+    parser.add_argument('--attach', type=int, metavar='PORT', help='连接（必要时启动）常驻 Chrome 的调试端口，运行结束后不关闭浏览器')
+    parser.add_argument('--workers', type=int, default=1, help='随机浏览模式并行浏览器数量（每个使用独立会话目录）')
     args = parser.parse_args()
 
-    # 配置文件加载/保存
-    def load_settings(path='settings.json'):
-        try:
-            if os.path.exists(path):
-                with open(path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-        except Exception:
-            pass
-        return {}
-
-    def save_settings(settings, path='settings.json'):
-        try:
-            with open(path, 'w', encoding='utf-8') as f:
-                json.dump(settings, f, ensure_ascii=False, indent=2)
-            print(f"✅ 已保存配置到 {path}")
-        except Exception as e:
-            print(f"⚠️ 保存配置失败: {e}")
-
     def do_configure():
         print("\n🛠️  配置网站与默认参数")
-        current = load_settings()
-        def ask(prompt, default=None):
-            sfx = f" (默认: {default})" if default not in [None, ''] else ''
-            val = input(f"{prompt}{sfx}: ").strip()
-            return val if val else default
-        base = ask('网站主页URL', current.get('base_url', 'https://shuiyuan.sjtu.edu.cn'))
-        cycles_def = current.get('default_cycles', 5)
-        try:
-            cyc = int(ask('默认循环次数', cycles_def))
-        except Exception:
-            cyc = cycles_def
-        head = ask('默认无头模式? (y/n)', 'n').lower() in ['y', 'yes']
-        like = ask('默认启用点赞? (y/n)', 'y').lower() not in ['n', 'no']
-        # 可选：指定本地chromedriver路径，适合离线/公司网络
-        chromedriver_path = ask('指定chromedriver绝对路径(留空自动)', (current.get('chromedriver_path') or ''))
-        rate_current = normalize_rate_config(current.get('rate_control'))
+        raw_settings = load_settings()
+        current = normalize_settings(raw_settings)
+        answers = {
+            'base_url': _ask('网站主页URL', current['base_url']),
+            'default_cycles': _ask('默认循环次数', current['default_cycles']),
+            'default_headless': _ask('默认无头模式? (y/n)', 'y' if current['default_headless'] else 'n'),
+            'default_like': _ask('默认启用点赞? (y/n)', 'y' if current['default_like'] else 'n'),
+            # 可选：指定本地chromedriver路径，适合离线/公司网络
+            'chromedriver_path': _ask('指定chromedriver绝对路径(留空自动)', current['chromedriver_path']),
+        }
+        rate_current = current['rate_control']
 
         def ask_rate(prompt, key):
-            default_val = str(rate_current.get(key, DEFAULT_RATE_CONFIG[key]))
-            return ask(prompt, default_val)
+            return _ask(prompt, str(rate_current[key]))
 
-        raw_rate = {
+        answers['rate_control'] = {
             'scroll_delay_min': ask_rate('滚动最小间隔(秒)', 'scroll_delay_min'),
             'scroll_delay_max': ask_rate('滚动最大间隔(秒)', 'scroll_delay_max'),
             'like_delay_min': ask_rate('点赞最小间隔(秒)', 'like_delay_min'),
@@ -998,136 +2449,116 @@ def main():
             'topic_delay_min': ask_rate('帖子间最小停顿(秒)', 'topic_delay_min'),
             'topic_delay_max': ask_rate('帖子间最大停顿(秒)', 'topic_delay_max'),
         }
-        rate_control = normalize_rate_config(raw_rate)
-        settings = {
-            'base_url': base,
-            'default_cycles': max(1, int(cyc)),
-            'default_headless': bool(head),
-            'default_like': bool(like),
-            'rate_control': rate_control,
-            'chromedriver_path': chromedriver_path or '',
-        }
-        save_settings(settings)
+        # 一次性校验全部回答（输错的项沿用当前值）；保留向导未涉及的手动配置项（如 blocked_urls）
+        settings = normalize_settings(dict(raw_settings, **answers), current)
+        # 全部回车沿用原值时文件内容不变，跳过写盘
+        if settings != raw_settings:
+            save_settings(settings)
+        return settings
 
     # 无需指令即可运行：首次运行自动进入配置向导
     if args.configure:
         do_configure()
         return
 
+    # 依赖检查（支持自动安装）：--help 与 --configure 只需标准库，之后才需要浏览器相关依赖
+    if not ensure_dependencies():
+        return
+    _load_selenium()
+
+    # 非交互环境（cron/CI/管道）下只使用命令行参数与已保存配置，不再逐项询问
+    interactive = sys.stdin.isatty()
+
     settings = load_settings()
-    if not settings or 'base_url' not in settings:
+    if (not settings or 'base_url' not in settings) and interactive:
         print('\n🧭 检测到首次运行，进入一次性配置向导...')
-        do_configure()
-        settings = load_settings()
+        # 直接使用向导刚保存的配置，无需再读一次文件
+        settings = do_configure()
 
-    # 参数与默认值合并
-    base_url = args.base_url or settings.get('base_url') or 'https://shuiyuan.sjtu.edu.cn'
-    cycles = args.cycles if args.cycles is not None else int(settings.get('default_cycles', 5))
-    headless = args.headless or (settings.get('default_headless', False) and not args.no_headless)
-    if args.no_headless:
-        headless = False
-    enable_like = True
-    if args.like:
-        enable_like = True
-    elif args.no_like:
-        enable_like = False
-    else:
-        enable_like = bool(settings.get('default_like', True))
+    # 参数与默认值合并（已保存的配置先统一校验一次）
+    settings = normalize_settings(settings)
+    base_url = args.base_url or settings['base_url']
+    cycles = args.cycles if args.cycles is not None else settings['default_cycles']
+    headless = _resolve_tri(args.headless, args.no_headless, settings['default_headless'])
+    enable_like = _resolve_tri(args.like, args.no_like, settings['default_like'])
 
-    rate_config = normalize_rate_config(settings.get('rate_control'))
+    rate_config = settings['rate_control']
 
     # 未通过指令指定时，提供模式选择（不需要命令行参数）
     mode = args.mode
+    if not mode and not interactive:
+        mode = 'random'
     if not mode:
         print("\n📋 运行模式: 1=随机浏览, 2=直接链接")
-        raw = input("请选择(1/2, 默认1): ").strip()
+        raw = _prompt("请选择(1/2, 默认1): ").strip()
         mode = 'direct' if raw == '2' else 'random'
     direct_url = args.url
 
     # 若缺少必要输入则交互补足
     if mode == 'direct' and not direct_url:
-        direct_url = input('请输入帖子链接(URL): ').strip()
+        direct_url = _prompt('请输入帖子链接(URL): ').strip() if interactive else ''
         if not direct_url:
             print('❌ 未提供链接，退出')
             return
 
-    if mode == 'random' and (args.cycles is None):
+    if mode == 'random' and (args.cycles is None) and interactive:
         try:
-            raw = input(f"请输入循环次数(默认{cycles}): ").strip()
+            raw = _prompt(f"请输入循环次数(默认{cycles}): ").strip()
             if raw:
                 cycles = max(1, int(raw))
         except Exception:
             pass
 
-    if args.headless is False and args.no_headless is False:
+    if not (args.headless or args.no_headless) and interactive:
         # 未通过参数指定时，询问一次
-        ans = input(f"是否无头模式? (y/n, 默认{'y' if headless else 'n'}): ").strip().lower()
-        if ans in ['y', 'yes']:
-            headless = True
-        elif ans in ['n', 'no']:
-            headless = False
-
-    if not (args.like or args.no_like):
-        ans = input(f"是否启用点赞? (y/n, 默认{'y' if enable_like else 'n'}): ").strip().lower()
-        if ans in ['y', 'yes']:
-            enable_like = True
-        elif ans in ['n', 'no']:
-            enable_like = False
-
-    # 概览
-    print('\n配置概览:')
-    print(f"- 站点: {base_url}")
-    print(f"- 模式: {mode}")
-    if mode == 'direct':
-        print(f"- 链接: {direct_url}")
-    else:
-        print(f"- 循环: {cycles}")
-    print(f"- 无头: {'是' if headless else '否'}")
-    print(f"- 点赞: {'启用' if enable_like else '禁用'}")
-    print(f"- 滚动间隔: {rate_config['scroll_delay_min']:.2f}-{rate_config['scroll_delay_max']:.2f}s")
-    print(f"- 点赞间隔: {rate_config['like_delay_min']:.2f}-{rate_config['like_delay_max']:.2f}s")
-    try:
-        lps = int(float(rate_config.get('likes_per_scroll', 0)))
-    except Exception:
-        lps = 0
-    print(f"- 每次滚动最多点赞: {'全部' if lps <= 0 else lps}")
-    print(f"- 帖子间停顿: {rate_config['topic_delay_min']:.2f}-{rate_config['topic_delay_max']:.2f}s")
+        headless = _ask_yes_no('是否无头模式?', headless)
+
+    if not (args.like or args.no_like) and interactive:
+        enable_like = _ask_yes_no('是否启用点赞?', enable_like)
+
+    # 概览（按模板一次格式化并写出）
+    lps = rate_config['likes_per_scroll']
+    sys.stdout.write(_SUMMARY_TEMPLATE.format_map({
+        'base_url': base_url,
+        'mode': mode,
+        'target': f"链接: {direct_url}" if mode == 'direct' else f"循环: {cycles}",
+        'headless': '是' if headless else '否',
+        'like': '启用' if enable_like else '禁用',
+        'lps': '全部' if lps <= 0 else lps,
+        'rate': rate_config,
+    }))
 
     # 启动浏览器（按站点使用持久用户数据目录，复用登录状态）
-    driver = None
     try:
-        def get_user_data_dir_for_site(site_url: str):
-            try:
-                host = urlparse(site_url).netloc or 'default'
-            except Exception:
-                host = 'default'
-            safe_host = re.sub(r"[^a-zA-Z0-9_.-]", "_", host)
-            root = os.path.join(os.path.abspath(os.getcwd()), ".chrome-profiles")
-            path = os.path.join(root, safe_host)
-            os.makedirs(path, exist_ok=True)
-            return path
-
         user_data_dir = get_user_data_dir_for_site(base_url)
-        # Install cleanup hooks early with profile information
-        _CLEANUP_CTX['user_data_dir'] = user_data_dir
-        _install_cleanup_handlers()
-
-        driver = setup_driver(headless=headless, user_data_dir=user_data_dir)
-        # Make driver available to cleanup hooks
-        _CLEANUP_CTX['driver'] = driver
-        print("✅ 浏览器已启动")
-        print(f"🔐 使用持久会话目录: {user_data_dir}")
-
-        # 登录（如需要）
-        if not ensure_login(driver, base_url, headless=headless):
-            print("⏹️ 未登录且为无头模式，已安全退出。")
+        if not args.attach and args.workers <= 1:
+            # 之前用 --attach 启动的常驻 Chrome 仍在运行、且无头/省流模式相同时直接复用
+            args.attach = read_attach_port(user_data_dir, headless, args.lite)
+        workers = max(1, min(args.workers or 1, cycles)) if mode == 'random' and not args.attach else 1
+        if workers > 1:
+            # 第一个进程沿用主会话目录，其余各自使用 <站点>-wN（需各自登录一次）
+            dirs = [user_data_dir] + [get_user_data_dir_for_site(base_url, f'-w{i}') for i in range(1, workers)]
+            print(f"🧵 并行浏览器: {workers}")
+            run_random_mode_parallel(
+                base_url, cycles, workers, enable_like, headless, rate_config, dirs, lite=args.lite
+            )
             return
+        with browser_session(
+            headless=headless, user_data_dir=user_data_dir, lite=args.lite, attach_port=args.attach
+        ) as driver:
+            print("✅ 浏览器已启动")
+            print(f"🔐 使用持久会话目录: {user_data_dir}")
+
+            # 登录（如需要）
+            if not ensure_login(driver, base_url, headless=headless):
+                print("⏹️ 未登录且为无头模式，已安全退出。")
+                return
 
-        # 跑模式
-        if mode == 'direct':
-            run_direct_mode(driver, direct_url, enable_like, headless, rate_config=rate_config)
-        else:
-            run_random_mode(driver, base_url, cycles, enable_like, headless, rate_config=rate_config)
+            # 跑模式
+            if mode == 'direct':
+                run_direct_mode(driver, direct_url, enable_like, headless, rate_config=rate_config)
+            else:
+                run_random_mode(driver, base_url, cycles, enable_like, headless, rate_config=rate_config)
 
     except KeyboardInterrupt:
         print("\n⏹️ 用户已中断")
@@ -1135,16 +2566,8 @@ def main():
         print(f"❌ 运行失败: {e}")
         print("👉 可尝试运行: python fix_startup_issue.py")
     finally:
-        try:
-            if driver:
-                driver.quit()
-        except Exception:
-            pass
-        # Ensure no stray Chrome remains for this profile (especially on macOS)
-        try:
-            _kill_chrome_for_profile(_CLEANUP_CTX.get('user_data_dir'))
-        except Exception:
-            pass
+        # Quit the driver and ensure no stray Chrome remains for this profile (especially on macOS)
+        _cleanup()
         print("\n程序结束")
 
 